@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数学加速扩展构建脚本
+将 src/utils/_math_ext.pyx 编译为就地扩展模块（需要 Cython 和 C 编译器）
+"""
+
+import os
+import platform
+import sys
+from pathlib import Path
+
+# 切换到项目根目录，使扩展生成在 src/utils 下
+project_root = Path(__file__).parent.parent
+os.chdir(project_root)
+
+try:
+    from setuptools import setup, Extension
+    from Cython.Build import cythonize
+except ImportError:
+    print("❌ 缺少构建依赖，请先安装: pip install cython setuptools")
+    sys.exit(1)
+
+
+def main():
+    """主函数"""
+    compile_args = ['-O3', '-ffast-math']
+    if platform.machine().lower() in ('x86_64', 'amd64'):
+        compile_args.append('-mavx2')
+
+    extension = Extension(
+        'src.utils._math_ext',
+        ['src/utils/_math_ext.pyx'],
+        extra_compile_args=compile_args,
+    )
+
+    setup(
+        name='smartbin-math-ext',
+        ext_modules=cythonize([extension], language_level=3),
+        script_args=['build_ext', '--inplace'],
+    )
+    print("✅ 数学加速扩展构建完成")
+
+
+if __name__ == "__main__":
+    main()
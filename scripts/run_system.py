@@ -7,14 +7,22 @@
 
 import sys
 import socket
+import asyncio
 import argparse
 from pathlib import Path
 
+# hypercorn 为可选依赖，可用时以ASGI方式运行（视频流不再每个客户端占用一个线程）
+try:
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config as HypercornConfig
+except ImportError:
+    serve = None
+
 # 添加项目根目录到Python路径
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.web_interface.app import create_app
+from src.web_interface.app import create_app, create_asgi_app
 from src.utils.config_loader import config_loader
 
 
@@ -56,8 +64,6 @@ def main():
     print("SmartBin 垃圾分拣系统")
     print("=" * 60)
     
-    # 创建Flask应用
-    app = create_app()
     
     # 获取配置
     web_config = config_loader.get_web_server_config()
@@ -84,8 +90,14 @@ def main():
     else:
         debug = web_config.get('debug', True)
     
+    # 调试模式使用Werkzeug（保留调试器，多线程处理请求）；
+    # 关闭调试且hypercorn可用时以ASGI方式运行，视频流不再每个客户端占用一个线程
+    use_asgi = serve is not None and not debug
+    app = create_asgi_app() if use_asgi else create_app()
+    
     print(f"服务器地址: http://{host}:{port}")
     print(f"调试模式: {'开启' if debug else '关闭'}")
+    print(f"服务器: {'hypercorn (ASGI)' if use_asgi else 'Werkzeug'}")
     print("\n功能模块:")
     print("  • 实时垃圾检测")
     print("  • 模型训练管理")
@@ -108,13 +120,19 @@ def main():
     print("=" * 60)
     
     try:
-        app.run(
-            host=host,
-            port=port,
-            debug=debug,
-            threaded=True,
-            use_reloader=False  # 避免重复加载
-        )
+        if use_asgi:
+            config = HypercornConfig()
+            config.bind = [f"{host}:{port}"]
+            config.use_reloader = False  # 避免重复加载
+            asyncio.run(serve(app, config))
+        else:
+            app.run(
+                host=host,
+                port=port,
+                debug=debug,
+                threaded=True,
+                use_reloader=False  # 避免重复加载
+            )
     except KeyboardInterrupt:
         print("\n服务器已停止")
     except Exception as e:
@@ -12,11 +12,15 @@ import time
 import logging
 import threading
 import os
+from multiprocessing import shared_memory, Value
 from typing import Optional, Tuple, Dict, Any
 from pathlib import Path
 
 from ..utils.config_loader import config_loader
 
+# 共享内存帧环形缓冲区的槽位数，读者最多落后 (槽位数-1) 帧而不会读到正在写入的数据
+FRAME_RING_SLOTS = 3
+
 
 class CameraController:
     """摄像头控制器（支持虚拟模式）"""
@@ -35,6 +39,11 @@ class CameraController:
         self.is_running = False
         self.current_frame = None
         self.frame_lock = threading.Lock()
+        
+        # 共享内存帧环形缓冲区：采集线程写入，读者通过帧序号判断是否有新帧
+        self.frame_generation = Value('Q', 0, lock=False)
+        self._frame_shm = None
+        self._frame_ring = None
         self.capture_thread = None
         
         # 摄像头参数
@@ -111,6 +120,8 @@ class CameraController:
             if self.cap and self.cap.isOpened():
                 self.cap.release()
             
+            self._release_frame_ring()
+            
             self.logger.info("摄像头已停止")
             
         except Exception as e:
@@ -157,8 +168,7 @@ class CameraController:
                 ret, frame = self.cap.read()
                 
                 if ret and frame is not None:
-                    with self.frame_lock:
-                        self.current_frame = frame.copy()
+                    self._publish_frame(frame)
                     
                     # 更新统计信息
                     self.frame_count += 1
@@ -190,6 +200,65 @@ class CameraController:
                 return self.current_frame.copy()
             return None
     
+    def get_latest_frame(self) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        获取最新帧的只读视图（零拷贝）
+        
+        视图直接指向共享内存环形缓冲区，读者应在采集线程写满一圈前用完；
+        需要修改图像时请先复制
+        
+        Returns:
+            (帧序号, 只读帧视图)，没有可用帧时视图为None
+        """
+        with self.frame_lock:
+            if self.current_frame is None:
+                return self.frame_generation.value, None
+            view = self.current_frame.view()
+            generation = self.frame_generation.value
+        view.flags.writeable = False
+        return generation, view
+    
+    def _publish_frame(self, frame: np.ndarray):
+        """将帧写入共享内存环形缓冲区的下一个槽位并递增帧序号"""
+        if self._frame_ring is None or self._frame_ring.shape[1:] != frame.shape:
+            self._allocate_frame_ring(frame.shape, frame.dtype)
+        
+        generation = self.frame_generation.value + 1
+        slot = self._frame_ring[generation % FRAME_RING_SLOTS]
+        np.copyto(slot, frame)
+        
+        with self.frame_lock:
+            self.current_frame = slot
+            self.frame_generation.value = generation
+    
+    def _allocate_frame_ring(self, shape: Tuple[int, ...], dtype):
+        """按帧尺寸分配共享内存环形缓冲区"""
+        self._release_frame_ring()
+        
+        ring_shape = (FRAME_RING_SLOTS,) + tuple(shape)
+        nbytes = int(np.prod(ring_shape)) * np.dtype(dtype).itemsize
+        self._frame_shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._frame_ring = np.ndarray(ring_shape, dtype=dtype, buffer=self._frame_shm.buf)
+    
+    def _release_frame_ring(self):
+        """释放共享内存环形缓冲区"""
+        with self.frame_lock:
+            self.current_frame = None
+        self._frame_ring = None
+        
+        if self._frame_shm is not None:
+            shm = self._frame_shm
+            self._frame_shm = None
+            try:
+                shm.close()
+            except BufferError:
+                # 仍有读者持有视图，内存在视图释放后回收
+                pass
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+    
     def capture_single_frame(self) -> Optional[np.ndarray]:
         """
         单次拍照模式
@@ -404,8 +473,7 @@ class CameraController:
                 frame = self._generate_virtual_frame()
                 
                 if frame is not None:
-                    with self.frame_lock:
-                        self.current_frame = frame.copy()
+                    self._publish_frame(frame)
                     
                     # 更新统计信息
                     self.frame_count += 1
@@ -6,8 +6,11 @@
 提供向后兼容的接口包装器
 """
 
+import itertools
 import logging
-from typing import Dict, List, Optional
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 # 导入抽象接口
 from .robot_arm_interface import (
@@ -26,6 +29,9 @@ from .robot_arm_virtual import VirtualRobotArm
 # 设置日志记录器
 logger = logging.getLogger(__name__)
 
+# 机械臂连接序号：每次创建/切换实例或连接/断开时递增，供上层缓存作键
+_connection_ids = itertools.count(1)
+
 
 class RobotArmController:
     """
@@ -47,8 +53,12 @@ class RobotArmController:
         self.config = config or {}
         self.arm_type = self.config.get('arm_type', 'virtual')
         
+        # 操作占用标记：非阻塞获取即为原子的 空闲→占用 转换
+        self._reservation = threading.Lock()
+        
         # 创建具体的机械臂实例
         self._arm_instance = self._create_arm_instance()
+        self._bump_connection_id()
         
         if self._arm_instance is None:
             logger.error(f"❌ 无法创建机械臂实例: {self.arm_type}")
@@ -56,6 +66,10 @@ class RobotArmController:
         
         logger.info(f"✅ 机械臂控制器初始化完成: {self.arm_type}")
     
+    def _bump_connection_id(self):
+        """连接/实例变化时取新的连接序号（进程内单调递增，不会像id()那样被复用）"""
+        self.connection_id = next(_connection_ids)
+    
     def _create_arm_instance(self) -> Optional[RobotArmInterface]:
         """创建机械臂实例"""
         try:
@@ -104,10 +118,12 @@ class RobotArmController:
     
     def connect(self) -> bool:
         """连接机械臂"""
+        self._bump_connection_id()
         return self._arm_instance.connect() if self._arm_instance else False
     
     def disconnect(self) -> bool:
         """断开机械臂连接"""
+        self._bump_connection_id()
         return self._arm_instance.disconnect() if self._arm_instance else False
     
     def home(self) -> bool:
@@ -166,6 +182,24 @@ class RobotArmController:
         
         return self._arm_instance.get_status()
     
+    def try_reserve(self) -> bool:
+        """
+        尝试占用机械臂以执行一次操作（非阻塞）
+        
+        Returns:
+            bool: 占用成功返回True，已被其他请求占用返回False
+        """
+        return self._reservation.acquire(blocking=False)
+    
+    def release_reservation(self):
+        """
+        释放操作占用标记
+        
+        只能在 try_reserve() 成功后的 try/finally 中调用；未占用时释放会抛出 RuntimeError，
+        避免误调用悄悄释放其他请求正在进行的占用
+        """
+        self._reservation.release()
+    
     # ==================== 扩展功能接口 ====================
     
     def move_to_joints(self, angles: JointAngles, speed: Optional[float] = None) -> bool:
@@ -217,6 +251,11 @@ class RobotArmController:
         else:
             return []
     
+    @property
+    def history_version(self) -> Optional[int]:
+        """统计信息/操作历史的版本号（虚拟机械臂专用），不支持时返回None"""
+        return getattr(self._arm_instance, 'history_version', None)
+    
     def reset_statistics(self) -> bool:
         """重置统计信息（虚拟机械臂专用）"""
         if hasattr(self._arm_instance, 'reset_statistics'):
@@ -269,6 +308,7 @@ class RobotArmController:
             new_instance = self._create_arm_instance()
             if new_instance:
                 self._arm_instance = new_instance
+                self._bump_connection_id()
                 logger.info(f"✅ 机械臂类型切换成功: {new_arm_type}")
                 return True
             else:
@@ -330,12 +370,14 @@ def create_robot_arm_controller(arm_type: str = 'virtual', config: Optional[Dict
 
 # ==================== 便捷函数 ====================
 
-def get_supported_arm_types() -> List[str]:
-    """获取支持的机械臂类型列表"""
-    return ['virtual', 'uarm']
+@lru_cache(maxsize=None)
+def get_supported_arm_types() -> Tuple[str, ...]:
+    """获取支持的机械臂类型列表（静态数据，结果被缓存）"""
+    return ('virtual', 'uarm')
 
+@lru_cache(maxsize=None)
 def get_arm_type_info(arm_type: str) -> Dict:
-    """获取机械臂类型信息"""
+    """获取机械臂类型信息（静态数据，结果被缓存，调用方请勿修改返回的字典）"""
     info_map = {
         'virtual': {
             'name': '虚拟机械臂',
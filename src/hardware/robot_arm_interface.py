@@ -9,6 +9,7 @@ from abc import ABC, abstractmethod
 from typing import Dict, List, Optional, Tuple
 from enum import Enum
 from dataclasses import dataclass
+import importlib.util
 import logging
 
 # 获取日志记录器
@@ -456,6 +457,23 @@ class RobotArmInterface(ABC):
 
 # ==================== 辅助函数 ====================
 
+def _detect_available_arm_types() -> set:
+    """
+    检测驱动依赖已安装的机械臂类型（只查找模块，不导入驱动）
+    
+    Returns:
+        set: 可用的机械臂类型
+    """
+    arm_types = {'virtual'}
+    if importlib.util.find_spec('serial') is not None:
+        arm_types.add('uarm')
+    return arm_types
+
+
+# 驱动依赖已安装的机械臂类型，模块导入时确定
+AVAILABLE_ARM_TYPES = _detect_available_arm_types()
+
+
 def create_robot_arm(arm_type: str, config: Optional[Dict] = None) -> Optional[RobotArmInterface]:
     """
     工厂函数：根据类型创建机械臂实例
@@ -496,5 +514,6 @@ __all__ = [
     'JointAngles',
     'GrabParameters',
     'ArmConfiguration',
+    'AVAILABLE_ARM_TYPES',
     'create_robot_arm'
 ] 
\ No newline at end of file
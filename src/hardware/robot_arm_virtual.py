@@ -81,6 +81,9 @@ class VirtualRobotArm(RobotArmInterface):
         # 操作历史
         self.operation_history = []
         
+        # 统计/历史版本号，每次变更时递增，供调用方判断缓存是否失效
+        self.history_version = 0
+        
         # 错误列表
         self.errors = []
         
@@ -169,6 +172,7 @@ class VirtualRobotArm(RobotArmInterface):
                 self.is_moving = False
                 self.current_status = ArmStatus.IDLE
                 self.statistics['movement_count'] += 1
+                self.history_version += 1
                 
                 self.logger.info("✅ 机械臂归位完成")
                 return True
@@ -232,6 +236,7 @@ class VirtualRobotArm(RobotArmInterface):
                 self.is_moving = False
                 self.current_status = ArmStatus.IDLE
                 self.statistics['movement_count'] += 1
+                self.history_version += 1
                 
                 self.logger.info("✅ 移动完成")
                 return True
@@ -270,6 +275,7 @@ class VirtualRobotArm(RobotArmInterface):
                 self.is_moving = False
                 self.current_status = ArmStatus.IDLE
                 self.statistics['movement_count'] += 1
+                self.history_version += 1
                 
                 self.logger.info("✅ 关节移动完成")
                 return True
@@ -318,6 +324,7 @@ class VirtualRobotArm(RobotArmInterface):
                     self.has_object = True
                     self.grab_force = params.force
                     self.statistics['grab_count'] += 1
+                    self.history_version += 1
                     self.current_status = ArmStatus.IDLE
                     self.logger.info("✅ 抓取成功")
                     return True
@@ -350,6 +357,7 @@ class VirtualRobotArm(RobotArmInterface):
                 
                 self.has_object = False
                 self.statistics['release_count'] += 1
+                self.history_version += 1
                 self.current_status = ArmStatus.IDLE
                 
                 self.logger.info("✅ 物体释放成功")
@@ -452,6 +460,7 @@ class VirtualRobotArm(RobotArmInterface):
                     'position': garbage_info.bin_position.to_dict()
                 }
                 self.operation_history.append(operation)
+                self.history_version += 1
                 
                 self.logger.info(f"✅ 垃圾分拣完成: {garbage_info.name}")
                 return True
@@ -469,6 +478,7 @@ class VirtualRobotArm(RobotArmInterface):
                     'error': str(e)
                 }
                 self.operation_history.append(operation)
+                self.history_version += 1
                 
                 # 重置状态为ERROR，但确保不影响后续操作
                 self.current_status = ArmStatus.ERROR
@@ -501,6 +511,7 @@ class VirtualRobotArm(RobotArmInterface):
                 'garbage_sorted': {name: 0 for name in self.garbage_bins.keys()}
             }
             self.operation_history.clear()
+            self.history_version += 1
             self.logger.info("📊 统计信息已重置")
             return True
         except Exception as e:
@@ -10,32 +10,73 @@ import numpy as np
 import time
 import logging
 import os
+import json
+import tempfile
+import multiprocessing
 from pathlib import Path
 from typing import List, Dict, Any, Tuple, Optional, Union
 
-# 修复PyTorch 2.6权重加载问题
+# 修复PyTorch 2.6权重加载问题（全项目只在此处应用一次）
 import torch
 if hasattr(torch, 'serialization'):
-    # 为PyTorch 2.6添加安全全局变量
+    # 为PyTorch 2.6添加安全全局变量（需传入类对象，字符串不会生效），
+    # 供显式以 weights_only=True 加载的调用使用：YOLO检查点会pickle网络中的全部模块类、
+    # torch.nn 容器与层，以及保存训练参数的 IterableSimpleNamespace
     try:
-        torch.serialization.add_safe_globals(['ultralytics.nn.tasks.DetectionModel'])
-    except:
+        import inspect
+        import ultralytics.nn.modules as yolo_modules
+        import ultralytics.nn.tasks as yolo_tasks
+        from ultralytics.utils import IterableSimpleNamespace
+        safe_globals = [obj for module in (yolo_modules, yolo_tasks)
+                        for obj in vars(module).values()
+                        if inspect.isclass(obj) and issubclass(obj, torch.nn.Module)]
+        safe_globals += [obj for obj in vars(torch.nn).values()
+                         if inspect.isclass(obj) and issubclass(obj, torch.nn.Module)]
+        safe_globals.append(IterableSimpleNamespace)
+        torch.serialization.add_safe_globals(safe_globals)
+    except Exception:
         pass
 
-# 全局修复torch.load函数
-original_torch_load = torch.load
-def patched_torch_load(*args, **kwargs):
-    # 强制设置weights_only=False
-    kwargs.pop('weights_only', None)  # 移除可能存在的weights_only参数
-    return original_torch_load(*args, weights_only=False, **kwargs)
-
-torch.load = patched_torch_load
+# 全局修复torch.load函数：未指定时使用 weights_only=False（检查点还可能引用白名单以外的对象，
+# 先尝试 weights_only=True 失败后会重复反序列化）；调用方显式传入的 weights_only 保持不变
+if not hasattr(torch, '_original_load'):
+    torch._original_load = torch.load
+    
+    def patched_torch_load(*args, **kwargs):
+        kwargs.setdefault('weights_only', False)
+        if len(args) < 2:
+            kwargs.setdefault('map_location', 'cpu')
+        # 从文件路径加载时使用mmap，张量存储直接映射页缓存，避免加载时的内存峰值
+        if args and isinstance(args[0], (str, os.PathLike)) and 'mmap' not in kwargs:
+            try:
+                return torch._original_load(*args, mmap=True, **kwargs)
+            except (RuntimeError, TypeError, ValueError):
+                # 旧版非zip格式的权重文件或旧版PyTorch不支持mmap，回退到普通加载
+                pass
+        return torch._original_load(*args, **kwargs)
+    
+    torch.load = patched_torch_load
 
 # 设置环境变量
 os.environ['TORCH_WEIGHTS_ONLY'] = 'False'
 
 from ultralytics import YOLO
 
+# safetensors 为可选依赖：存在时为 .pt 模型生成权重旁路文件，避免每次都走 pickle 反序列化
+try:
+    from safetensors import safe_open
+    from safetensors.torch import save_file as save_safetensors
+except ImportError:
+    safe_open = None
+    save_safetensors = None
+
+# onnxruntime 为可选依赖：存在时支持将模型导出为ONNX并进行INT8量化
+try:
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+except ImportError:
+    quantize_dynamic = None
+    QuantType = None
+
 from ..utils.config_loader import config_loader
 from ..utils.image_utils import ImageProcessor
 from ..utils.math_utils import MathUtils
@@ -44,11 +85,22 @@ from ..utils.math_utils import MathUtils
 class GarbageDetector:
     """垃圾检测器"""
     
-    def __init__(self, model_path: Optional[str] = None):
+    # 定义类别颜色 (BGR)
+    CATEGORY_COLORS = {
+        'organic': (0, 255, 0),      # 绿色
+        'recyclable': (255, 0, 0),   # 蓝色
+        'other': (0, 0, 255),        # 红色
+        'unknown': (128, 128, 128)   # 灰色
+    }
+    
+    def __init__(self, model_path: Optional[str] = None, load_in_subprocess: bool = False):
         self.config = config_loader.get_model_config()
         self.system_config = config_loader.get_system_config()
         
         self.model = None
+        self.model_path = None
+        # PyTorch权重和动态batch的INT8引擎支持一次调用处理多帧；静态batch=1的INT8 ONNX逐帧推理
+        self.supports_batch = False
         self.class_names = self.config.get('classes', {}).get('names', [])
         self.class_categories = self.config.get('classes', {}).get('categories', {})
         
@@ -56,6 +108,7 @@ class GarbageDetector:
         self.confidence_threshold = self.config.get('model', {}).get('confidence_threshold', 0.25)
         self.iou_threshold = self.config.get('model', {}).get('iou_threshold', 0.45)
         self.max_detections = self.config.get('model', {}).get('max_detections', 300)
+        self.input_size = self.config.get('model', {}).get('input_size', 640)
         
         # 性能监控
         self.frame_times = []
@@ -66,24 +119,34 @@ class GarbageDetector:
         
         # 加载模型 - 如果没有指定路径，使用默认模型路径
         if model_path:
-            self.load_model(model_path)
+            self.load_model(model_path, load_in_subprocess)
         else:
             # 尝试加载默认模型路径
             default_path = config_loader.get_default_model_path()
             if Path(default_path).exists():
-                self.load_model(default_path)
+                self.load_model(default_path, load_in_subprocess)
             else:
                 self.logger.warning(f"默认模型文件不存在: {default_path}")
     
-    def load_model(self, model_path: str):
+    def load_model(self, model_path: str, load_in_subprocess: bool = False):
         """
         加载检测模型
         
         Args:
             model_path: 模型文件路径
+            load_in_subprocess: 是否在临时子进程中反序列化权重（适用于反复切换模型的长期运行进程）
         """
         try:
-            self.model = YOLO(model_path)
+            self.model = self._load_safetensors(model_path)
+            if self.model is None and load_in_subprocess:
+                self.model = self._load_in_subprocess(model_path)
+            if self.model is None:
+                self.model = YOLO(model_path)
+            if self.model is not None:
+                self.model_path = model_path
+                self.supports_batch = Path(model_path).suffix == '.pt'
+                if not self._safetensors_fresh(model_path):
+                    self._export_safetensors(model_path)
             self.logger.info(f"成功加载检测模型: {model_path}")
             
             # 预热模型
@@ -93,6 +156,160 @@ class GarbageDetector:
             self.logger.error(f"加载检测模型失败: {e}")
             raise
     
+    @staticmethod
+    def _safetensors_path(model_path: str) -> Path:
+        """获取模型对应的 safetensors 旁路文件路径"""
+        return Path(model_path).with_suffix('.safetensors')
+    
+    @classmethod
+    def _safetensors_fresh(cls, model_path: str) -> bool:
+        """旁路文件是否存在且不旧于原始 .pt 文件"""
+        sidecar = cls._safetensors_path(model_path)
+        return sidecar.exists() and sidecar.stat().st_mtime >= Path(model_path).stat().st_mtime
+    
+    def _load_safetensors(self, model_path: str) -> Optional[YOLO]:
+        """
+        从 safetensors 旁路文件加载模型（直接读取张量数据，无需 pickle 反序列化）
+        
+        Args:
+            model_path: 原始 .pt 模型文件路径
+        
+        Returns:
+            加载成功返回YOLO模型，旁路文件不存在、已过期或加载失败返回None
+        """
+        if safe_open is None or Path(model_path).suffix != '.pt':
+            return None
+        
+        if not self._safetensors_fresh(model_path):
+            return None
+        sidecar = self._safetensors_path(model_path)
+        
+        try:
+            with safe_open(str(sidecar), framework='pt', device='cpu') as f:
+                metadata = f.metadata() or {}
+                state_dict = {key: f.get_tensor(key) for key in f.keys()}
+            
+            model_cfg = json.loads(metadata['model_yaml'])
+            names = {int(k): v for k, v in json.loads(metadata['names']).items()}
+            model = self._build_model(model_cfg, names, state_dict)
+            self.logger.info(f"已从safetensors加载模型权重: {sidecar}")
+            return model
+            
+        except Exception as e:
+            self.logger.warning(f"safetensors加载失败，回退到原始模型文件: {e}")
+            return None
+    
+    def _load_in_subprocess(self, model_path: str) -> Optional[YOLO]:
+        """
+        在短生命周期的子进程中执行 torch.load，权重经共享内存传回
+        
+        反序列化产生的临时内存随子进程退出归还给操作系统，
+        避免多次加载模型后主进程内存持续增长
+        
+        Args:
+            model_path: 模型文件路径
+        
+        Returns:
+            加载成功返回YOLO模型，失败返回None
+        """
+        try:
+            ctx = multiprocessing.get_context('spawn')
+            with ctx.Pool(1) as pool:
+                model_cfg, names, state_dict = pool.apply(_load_weights_shared, (str(model_path),))
+            model = self._build_model(model_cfg, names, state_dict)
+            self.logger.info(f"已在子进程中加载模型权重: {model_path}")
+            return model
+        except Exception as e:
+            self.logger.warning(f"子进程加载模型失败，回退到进程内加载: {e}")
+            return None
+    
+    @staticmethod
+    def _build_model(model_cfg: Dict[str, Any], names: Dict[int, str],
+                     state_dict: Dict[str, torch.Tensor]) -> YOLO:
+        """按模型配置重建网络结构，并直接采用给定的权重张量（不复制）"""
+        # 保留原yaml文件名，以便ultralytics推断相同的模型规模
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cfg_path = Path(tmp_dir) / Path(model_cfg.get('yaml_file', 'model.yaml')).name
+            cfg_path.write_text(json.dumps(model_cfg), encoding='utf-8')
+            model = YOLO(str(cfg_path), task='detect')
+        
+        model.model.load_state_dict(state_dict, assign=True)
+        model.model.names = names
+        model.model.eval()
+        return model
+    
+    def _export_safetensors(self, model_path: str):
+        """将已加载模型的权重导出为 safetensors 旁路文件，供下次加载使用（仅在旁路文件缺失或过期时调用）"""
+        if save_safetensors is None or Path(model_path).suffix != '.pt':
+            return
+        
+        try:
+            network = self.model.model
+            state_dict = {key: value.detach().contiguous()
+                          for key, value in network.state_dict().items()}
+            metadata = {
+                'model_yaml': json.dumps(network.yaml),
+                'names': json.dumps({str(k): v for k, v in network.names.items()})
+            }
+            save_safetensors(state_dict, str(self._safetensors_path(model_path)), metadata=metadata)
+            self.logger.info(f"已生成safetensors权重文件: {self._safetensors_path(model_path)}")
+        except Exception as e:
+            self.logger.warning(f"导出safetensors权重失败: {e}")
+    
+    def quantize_int8(self, max_batch: int = 1) -> bool:
+        """
+        将当前模型量化为INT8
+        
+        CUDA可用时导出带INT8校准的TensorRT引擎（校准数据集取自导出配置的 int8_data），
+        保存为 <名称>_int8_b<最大batch>.engine；否则回退到onnxruntime动态量化（仅权重量化，只适合CPU推理），
+        保存为 <名称>_int8.onnx。已存在且不旧于原模型时直接复用
+        
+        Args:
+            max_batch: TensorRT引擎支持的最大batch（动态batch导出，供 detect_batch 使用）
+        
+        Returns:
+            是否量化成功
+        """
+        if self.model is None:
+            raise ValueError("模型未加载，请先加载模型")
+        
+        try:
+            source = Path(self.model_path)
+            if torch.cuda.is_available():
+                # 文件名带最大batch，不同batch配置的引擎互不复用
+                int8_path = source.with_name(f"{source.stem}_int8_b{max_batch}.engine")
+                if not int8_path.exists() or int8_path.stat().st_mtime < source.stat().st_mtime:
+                    export_args = {'int8': True, 'imgsz': self.input_size,
+                                   'dynamic': max_batch > 1, 'batch': max_batch}
+                    int8_data = self.config.get('export', {}).get('int8_data')
+                    if int8_data:
+                        export_args['data'] = int8_data
+                    else:
+                        self.logger.warning("未配置 export.int8_data，INT8校准使用ultralytics默认数据集")
+                    engine_path = self.model.export(format='engine', **export_args)
+                    os.replace(engine_path, int8_path)
+                supports_batch = max_batch > 1
+            else:
+                if quantize_dynamic is None:
+                    self.logger.warning("CUDA不可用且未安装onnxruntime，跳过INT8量化")
+                    return False
+                self.logger.warning("CUDA不可用，使用onnxruntime动态量化（仅权重INT8，CPU推理）")
+                int8_path = source.with_name(f"{source.stem}_int8.onnx")
+                if not int8_path.exists() or int8_path.stat().st_mtime < source.stat().st_mtime:
+                    onnx_path = self.model.export(format='onnx', imgsz=self.input_size)
+                    quantize_dynamic(str(onnx_path), str(int8_path), weight_type=QuantType.QInt8)
+                # 导出的ONNX为静态batch=1，逐帧推理
+                supports_batch = False
+            
+            self.model = YOLO(str(int8_path), task='detect')
+            self.supports_batch = supports_batch
+            self._warmup_model()
+            self.logger.info(f"已加载INT8量化模型: {int8_path}")
+            return True
+        except Exception as e:
+            self.logger.error(f"INT8量化失败: {e}")
+            return False
+    
     def _warmup_model(self):
         """预热模型以提高推理速度"""
         if self.model is None:
@@ -140,39 +357,88 @@ class GarbageDetector:
                 verbose=False
             )
             
-            # 解析检测结果
-            detection_result = self._parse_results(results[0], image.shape)
-            
-            # 记录检测时间
-            detection_time = time.time() - start_time
-            self.frame_times.append(time.time())
-            
-            # 保持frame_times列表长度
-            if len(self.frame_times) > 30:
-                self.frame_times = self.frame_times[-30:]
-            
-            # 计算FPS
-            fps = MathUtils.calculate_fps(self.frame_times)
-            
-            detection_result.update({
-                'detection_time': detection_time,
-                'fps': fps,
-                'image_shape': image.shape
-            })
+            return self._finalize_detection(results[0], image, start_time)
             
-            # 记录检测历史
-            self.detection_history.append({
-                'timestamp': time.time(),
-                'detections': len(detection_result['detections']),
-                'categories': detection_result['category_counts']
-            })
+        except Exception as e:
+            self.logger.error(f"检测失败: {e}")
+            raise
+    
+    def detect_batch(self, images: List[np.ndarray]) -> List[Tuple[np.ndarray, Dict[str, Any]]]:
+        """
+        批量检测并绘制结果（支持batch的模型一次调用处理多帧并在CUDA可用时使用FP16，
+        其余模型逐帧调用）
+        
+        Args:
+            images: 输入图像列表 (BGR格式)
+        
+        Returns:
+            [(绘制了检测结果的图像, 检测结果字典), ...]，与输入顺序一致
+        """
+        if self.model is None:
+            raise ValueError("模型未加载，请先加载模型")
+        
+        start_time = time.time()
+        
+        try:
+            if self.supports_batch:
+                results = self.model(
+                    list(images),
+                    conf=self.confidence_threshold,
+                    iou=self.iou_threshold,
+                    max_det=self.max_detections,
+                    half=torch.cuda.is_available(),
+                    verbose=False
+                )
+            else:
+                results = [self.model(
+                    image,
+                    conf=self.confidence_threshold,
+                    iou=self.iou_threshold,
+                    max_det=self.max_detections,
+                    verbose=False
+                )[0] for image in images]
             
-            return detection_result
+            outputs = []
+            for result, image in zip(results, images):
+                detection_result = self._finalize_detection(result, image, start_time)
+                outputs.append((self._draw_results(image, detection_result), detection_result))
+            return outputs
             
         except Exception as e:
-            self.logger.error(f"检测失败: {e}")
+            self.logger.error(f"批量检测失败: {e}")
             raise
     
+    def _finalize_detection(self, result, image: np.ndarray, start_time: float) -> Dict[str, Any]:
+        """解析单帧检测结果，并记录检测耗时、FPS和检测历史"""
+        # 解析检测结果
+        detection_result = self._parse_results(result, image.shape)
+        
+        # 记录检测时间
+        detection_time = time.time() - start_time
+        self.frame_times.append(time.time())
+        
+        # 保持frame_times列表长度
+        if len(self.frame_times) > 30:
+            self.frame_times = self.frame_times[-30:]
+        
+        # 计算FPS
+        fps = MathUtils.calculate_fps(self.frame_times)
+        
+        detection_result.update({
+            'detection_time': detection_time,
+            'fps': fps,
+            'image_shape': image.shape
+        })
+        
+        # 记录检测历史
+        self.detection_history.append({
+            'timestamp': time.time(),
+            'detections': len(detection_result['detections']),
+            'categories': detection_result['category_counts']
+        })
+        
+        return detection_result
+    
     def _parse_results(self, result, image_shape: Tuple[int, int, int]) -> Dict[str, Any]:
         """
         解析YOLOv8检测结果
@@ -188,45 +454,57 @@ class GarbageDetector:
         category_counts = {category: 0 for category in self.class_categories.keys()}
         category_counts['unknown'] = 0
         
+        boxes = np.empty((0, 4), dtype=np.float32)
+        scores = np.empty(0, dtype=np.float32)
+        classes = np.empty(0, dtype=np.int32)
+        class_names = []
+        categories = []
+        
         if result.boxes is not None and len(result.boxes) > 0:
-            boxes = result.boxes.xyxy.cpu().numpy()  # 边界框坐标
-            scores = result.boxes.conf.cpu().numpy()  # 置信度
-            classes = result.boxes.cls.cpu().numpy().astype(int)  # 类别ID
+            boxes = result.boxes.xyxy.cpu().numpy().astype(np.float32, copy=False)  # 边界框坐标
+            scores = result.boxes.conf.cpu().numpy().astype(np.float32, copy=False)  # 置信度
+            classes = result.boxes.cls.cpu().numpy().astype(np.int32)  # 类别ID
             
-            for i in range(len(boxes)):
-                class_id = classes[i]
-                if class_id < len(self.class_names):
-                    class_name = self.class_names[class_id]
-                else:
-                    class_name = 'unknown'
-                
-                # 获取垃圾类别
-                garbage_category = self._get_garbage_category(class_name)
-                
+            # 一次性转换为Python列表，避免逐元素取值
+            boxes_list = boxes.tolist()
+            scores_list = scores.tolist()
+            num_names = len(self.class_names)
+            class_names = [self.class_names[c] if c < num_names else 'unknown'
+                           for c in classes.tolist()]
+            # 获取垃圾类别
+            categories = [self._get_garbage_category(name) for name in class_names]
+            
+            for i, (box, class_id) in enumerate(zip(boxes_list, classes.tolist())):
                 detection = {
                     'id': i,
-                    'class_id': int(class_id),
-                    'class_name': class_name,
-                    'category': garbage_category,
-                    'confidence': float(scores[i]),
+                    'class_id': class_id,
+                    'class_name': class_names[i],
+                    'category': categories[i],
+                    'confidence': scores_list[i],
                     'bbox': {
-                        'x1': float(boxes[i][0]),
-                        'y1': float(boxes[i][1]),
-                        'x2': float(boxes[i][2]),
-                        'y2': float(boxes[i][3])
+                        'x1': box[0],
+                        'y1': box[1],
+                        'x2': box[2],
+                        'y2': box[3]
                     },
-                    'center': MathUtils.box_center(boxes[i].tolist()),
-                    'area': MathUtils.box_area(boxes[i].tolist())
+                    'center': MathUtils.box_center(box),
+                    'area': MathUtils.box_area(box)
                 }
                 
                 detections.append(detection)
-                category_counts[garbage_category] += 1
+                category_counts[categories[i]] += 1
         
         return {
             'detections': detections,
             'total_detections': len(detections),
             'category_counts': category_counts,
-            'class_distribution': self._get_class_distribution(detections)
+            'class_distribution': self._get_class_distribution(detections),
+            # 原始数组，便于调用方批量处理
+            'boxes_xyxy': boxes,
+            'confidences': scores,
+            'class_ids': classes,
+            'class_names': class_names,
+            'categories': categories
         }
     
     def _get_garbage_category(self, class_name: str) -> str:
@@ -272,48 +550,55 @@ class GarbageDetector:
         # 执行检测
         results = self.detect(image)
         
-        # 绘制结果
+        result_image = self._draw_results(image, results, draw_boxes, draw_labels, draw_confidence)
+        
+        return result_image, results
+    
+    def _draw_results(self,
+                      image: np.ndarray,
+                      results: Dict[str, Any],
+                      draw_boxes: bool = True,
+                      draw_labels: bool = True,
+                      draw_confidence: bool = True) -> np.ndarray:
+        """在图像副本上绘制检测结果和统计信息"""
         result_image = image.copy()
         
         if draw_boxes and results['detections']:
-            boxes = []
-            labels = []
-            scores = []
-            colors = []
-            
-            # 定义类别颜色
-            category_colors = {
-                'organic': (0, 255, 0),      # 绿色
-                'recyclable': (255, 0, 0),   # 蓝色
-                'other': (0, 0, 255),        # 红色
-                'unknown': (128, 128, 128)   # 灰色
-            }
-            
-            for detection in results['detections']:
-                bbox = detection['bbox']
-                boxes.append([bbox['x1'], bbox['y1'], bbox['x2'], bbox['y2']])
-                
-                # 构建标签
-                label_parts = []
-                if draw_labels:
-                    label_parts.append(detection['class_name'])
-                if draw_confidence:
-                    label_parts.append(f"{detection['confidence']:.2f}")
-                
-                labels.append(' '.join(label_parts))
-                scores.append(detection['confidence'])
-                colors.append(category_colors.get(detection['category'], (255, 255, 255)))
+            boxes, labels, scores, colors = self._build_draw_items(
+                results, draw_labels, draw_confidence)
             
             # 绘制边界框
             result_image = ImageProcessor.draw_bounding_boxes(
-                result_image, boxes, labels, scores, colors
+                result_image, boxes, labels, scores, colors, inplace=True
             )
         
         # 绘制统计信息
         if results['total_detections'] > 0:
             self._draw_statistics(result_image, results)
         
-        return result_image, results
+        return result_image
+    
+    def _build_draw_items(self,
+                          results: Dict[str, Any],
+                          draw_labels: bool,
+                          draw_confidence: bool) -> Tuple[list, list, list, list]:
+        """构建绘制所需的边界框、标签、置信度和颜色列表"""
+        boxes = results['boxes_xyxy'].tolist()
+        scores = results['confidences'].tolist()
+        colors = [self.CATEGORY_COLORS.get(category, (255, 255, 255))
+                  for category in results['categories']]
+        
+        labels = []
+        for class_name, score in zip(results['class_names'], scores):
+            # 构建标签
+            label_parts = []
+            if draw_labels:
+                label_parts.append(class_name)
+            if draw_confidence:
+                label_parts.append(f"{score:.2f}")
+            labels.append(' '.join(label_parts))
+        
+        return boxes, labels, scores, colors
     
     def _draw_statistics(self, image: np.ndarray, results: Dict[str, Any]):
         """在图像上绘制统计信息"""
@@ -389,6 +674,23 @@ class GarbageDetector:
             raise ValueError("IoU阈值必须在0.0到1.0之间")
 
 
+def _load_weights_shared(model_path: str) -> Tuple[Dict[str, Any], Dict[int, str], Dict[str, torch.Tensor]]:
+    """
+    子进程入口：加载检查点并将权重移入共享内存
+    
+    Returns:
+        (模型配置, 类别名称, 共享内存中的权重字典)
+    """
+    import torch.multiprocessing  # noqa: F401  注册共享内存张量的跨进程序列化
+    
+    checkpoint = torch.load(model_path, map_location='cpu')
+    network = (checkpoint.get('ema') or checkpoint['model']).float()
+    state_dict = {key: value.detach().share_memory_()
+                  for key, value in network.state_dict().items()}
+    names = {int(k): v for k, v in network.names.items()}
+    return network.yaml, names, state_dict
+
+
 def create_detector(model_path: Optional[str] = None) -> GarbageDetector:
     """创建垃圾检测器实例"""
     return GarbageDetector(model_path) 
\ No newline at end of file
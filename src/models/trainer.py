@@ -330,6 +330,14 @@ class ModelTrainer:
         }
         export_args.update(kwargs)
         
+        # INT8 只对 TensorRT 引擎生效，校准数据集用训练数据的配置文件
+        engine_args = {}
+        if export_config.get('int8', False):
+            engine_args['int8'] = True
+            if export_config.get('int8_data'):
+                engine_args['data'] = export_config['int8_data']
+        engine_args.update(export_args)
+        
         for fmt in export_format:
             try:
                 self.logger.info(f"导出模型格式: {fmt}")
@@ -337,7 +345,7 @@ class ModelTrainer:
                 if fmt == 'onnx':
                     exported_path = model.export(format='onnx', **export_args)
                 elif fmt == 'engine':
-                    exported_path = model.export(format='engine', **export_args)
+                    exported_path = model.export(format='engine', **engine_args)
                 elif fmt == 'tflite':
                     exported_path = model.export(format='tflite', **export_args)
                 elif fmt == 'pb':
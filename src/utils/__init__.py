@@ -7,7 +7,7 @@
 from .config_loader import ConfigLoader
 
 # 延迟导入，避免在不需要时导入OpenCV相关模块
-__all__ = ["ConfigLoader", "ImageProcessor", "MathUtils"]
+__all__ = ["ConfigLoader", "ImageProcessor", "MathUtils", "BoxesSoA"]
 
 def __getattr__(name):
     if name == "ImageProcessor":
@@ -16,5 +16,8 @@ def __getattr__(name):
     elif name == "MathUtils":
         from .math_utils import MathUtils
         return MathUtils
+    elif name == "BoxesSoA":
+        from .math_utils import BoxesSoA
+        return BoxesSoA
     else:
         raise AttributeError(f"module '{__name__}' has no attribute '{name}'") 
\ No newline at end of file
@@ -0,0 +1,103 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+# -*- coding: utf-8 -*-
+"""
+数学计算加速扩展（可选）
+为 MathUtils 的 IoU / NMS 提供 C 循环实现，直接读取 BoxesSoA 的 float32 列
+
+构建方法: python scripts/build_math_ext.py
+未构建时 MathUtils 自动回退到 NumPy 实现
+"""
+
+import numpy as np
+from libc.math cimport fminf, fmaxf
+
+
+def iou_matrix(boxes1, boxes2):
+    """
+    计算两组边界框之间的IoU矩阵
+
+    Args:
+        boxes1: BoxesSoA（float32 连续列）
+        boxes2: BoxesSoA（float32 连续列）
+
+    Returns:
+        IoU矩阵 (N, M)，float32
+    """
+    cdef const float[::1] ax1 = boxes1.x1
+    cdef const float[::1] ay1 = boxes1.y1
+    cdef const float[::1] ax2 = boxes1.x2
+    cdef const float[::1] ay2 = boxes1.y2
+    cdef const float[::1] aarea = boxes1.area
+    cdef const float[::1] bx1 = boxes2.x1
+    cdef const float[::1] by1 = boxes2.y1
+    cdef const float[::1] bx2 = boxes2.x2
+    cdef const float[::1] by2 = boxes2.y2
+    cdef const float[::1] barea = boxes2.area
+    cdef Py_ssize_t n = ax1.shape[0]
+    cdef Py_ssize_t m = bx1.shape[0]
+    cdef Py_ssize_t i, j
+    cdef float w, h, inter, union
+
+    out = np.zeros((n, m), dtype=np.float32)
+    cdef float[:, ::1] iou = out
+
+    with nogil:
+        for i in range(n):
+            for j in range(m):
+                w = fminf(ax2[i], bx2[j]) - fmaxf(ax1[i], bx1[j])
+                h = fminf(ay2[i], by2[j]) - fmaxf(ay1[i], by1[j])
+                if w <= 0 or h <= 0:
+                    continue
+                inter = w * h
+                union = aarea[i] + barea[j] - inter
+                if union > 0:
+                    iou[i, j] = inter / union
+    return out
+
+
+def nms(boxes, const Py_ssize_t[::1] order, float iou_threshold):
+    """
+    贪心非极大值抑制
+
+    Args:
+        boxes: BoxesSoA（float32 连续列）
+        order: 已按置信度降序排列、并过滤低分后的候选索引
+        iou_threshold: IoU阈值
+
+    Returns:
+        保留的边界框索引数组 (int32)
+    """
+    cdef const float[::1] x1 = boxes.x1
+    cdef const float[::1] y1 = boxes.y1
+    cdef const float[::1] x2 = boxes.x2
+    cdef const float[::1] y2 = boxes.y2
+    cdef const float[::1] area = boxes.area
+    cdef Py_ssize_t n = order.shape[0]
+    cdef Py_ssize_t ii, jj, i, j, kept = 0
+    cdef float w, h, inter, union
+
+    suppressed_arr = np.zeros(n, dtype=np.uint8)
+    keep_arr = np.empty(n, dtype=np.int32)
+    cdef unsigned char[::1] suppressed = suppressed_arr
+    cdef int[::1] keep = keep_arr
+
+    with nogil:
+        for ii in range(n):
+            if suppressed[ii]:
+                continue
+            i = order[ii]
+            keep[kept] = <int>i
+            kept += 1
+            for jj in range(ii + 1, n):
+                if suppressed[jj]:
+                    continue
+                j = order[jj]
+                w = fminf(x2[i], x2[j]) - fmaxf(x1[i], x1[j])
+                h = fminf(y2[i], y2[j]) - fmaxf(y1[i], y1[j])
+                if w <= 0 or h <= 0:
+                    continue
+                inter = w * h
+                union = area[i] + area[j] - inter
+                if union > 0 and inter / union > iou_threshold:
+                    suppressed[jj] = 1
+    return keep_arr[:kept]
@@ -10,8 +10,19 @@ import numpy as np
 from PIL import Image
 import base64
 import io
+import threading
 from typing import Tuple, Optional, Union
 
+# PyTurboJPEG（libjpeg-turbo，SIMD加速）为可选依赖，不可用时回退到OpenCV编码
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420, TJSAMP_422
+    _turbo_jpeg = TurboJPEG()
+except Exception:
+    _turbo_jpeg = None
+
+# 每个线程复用的JPEG输出缓冲区（PyTurboJPEG 1.7+ 支持编码到预分配缓冲区）
+_encode_buffers = threading.local()
+
 
 class ImageProcessor:
     """图像处理工具类"""
@@ -120,6 +131,105 @@ class ImageProcessor:
         
         return f"data:image/{format.lower()};base64,{img_str}"
     
+    @staticmethod
+    def encode_jpeg(image: np.ndarray, quality: int = 85, chroma_420: bool = False) -> bytes:
+        """
+        将图像编码为JPEG字节
+        
+        Args:
+            image: 输入图像 (BGR格式)
+            quality: JPEG质量 (1-100)
+            chroma_420: 是否使用4:2:0色度抽样（视频流等对体积敏感的场景）
+        
+        Returns:
+            JPEG编码后的字节
+        """
+        if _turbo_jpeg is not None:
+            subsample = TJSAMP_420 if chroma_420 else TJSAMP_422
+            if not hasattr(_turbo_jpeg, 'buffer_size'):
+                return _turbo_jpeg.encode(image, quality=quality, pixel_format=TJPF_BGR,
+                                          jpeg_subsample=subsample)
+            
+            # 编码到线程内复用的缓冲区，避免每帧分配最大尺寸的输出内存
+            size = _turbo_jpeg.buffer_size(image, subsample)
+            buf = getattr(_encode_buffers, 'buf', None)
+            if buf is None or len(buf) < size:
+                buf = _encode_buffers.buf = bytearray(size)
+            _, length = _turbo_jpeg.encode(image, quality=quality, pixel_format=TJPF_BGR,
+                                           jpeg_subsample=subsample, dst=buf)
+            return bytes(memoryview(buf)[:length])
+        
+        # OpenCV 默认即为4:2:0色度抽样
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer.tobytes()
+    
+    @staticmethod
+    def jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+        """
+        从JPEG的SOF段读取图像尺寸，无需解码像素
+        
+        Args:
+            data: JPEG文件字节
+        
+        Returns:
+            (宽度, 高度)，非JPEG或无法解析时返回None
+        """
+        if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+            return None
+        
+        pos = 2
+        length = len(data)
+        while pos + 4 <= length:
+            if data[pos] != 0xFF:
+                return None
+            marker = data[pos + 1]
+            if marker == 0xFF:
+                # 填充字节
+                pos += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+                # 无长度字段的独立标记
+                pos += 2
+                continue
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                if pos + 9 > length:
+                    return None
+                height = (data[pos + 5] << 8) | data[pos + 6]
+                width = (data[pos + 7] << 8) | data[pos + 8]
+                return width, height
+            pos += 2 + ((data[pos + 2] << 8) | data[pos + 3])
+        return None
+    
+    @staticmethod
+    def decode_image(data: bytes, target_size: Optional[int] = None) -> Tuple[Optional[np.ndarray], int]:
+        """
+        解码图像字节，JPEG输入远大于目标尺寸时使用降采样解码
+        
+        Args:
+            data: 图像文件字节（bytes 或 memoryview）
+            target_size: 目标长边尺寸（如模型输入尺寸），为None时按原尺寸解码
+        
+        Returns:
+            (图像数组 (BGR格式)，缩小倍数)；解码失败时图像为None。
+            在解码图像上得到的坐标乘以缩小倍数即为原图坐标
+        """
+        flag = cv2.IMREAD_COLOR
+        reduction = 1
+        if target_size:
+            size = ImageProcessor.jpeg_size(data)
+            if size is not None:
+                long_side = max(size)
+                # 选择解码后长边仍不小于目标尺寸的最大缩小倍数
+                for factor, reduced_flag in ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                                             (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                             (2, cv2.IMREAD_REDUCED_COLOR_2)):
+                    if long_side // factor >= target_size:
+                        flag = reduced_flag
+                        reduction = factor
+                        break
+        
+        return cv2.imdecode(np.frombuffer(data, np.uint8), flag), reduction
+    
     @staticmethod
     def base64_to_image(base64_str: str) -> np.ndarray:
         """
@@ -151,7 +261,8 @@ class ImageProcessor:
                            boxes: list, 
                            labels: list = None,
                            scores: list = None,
-                           colors: list = None) -> np.ndarray:
+                           colors: list = None,
+                           inplace: bool = False) -> np.ndarray:
         """
         在图像上绘制边界框
         
@@ -161,11 +272,12 @@ class ImageProcessor:
             labels: 标签列表
             scores: 置信度分数列表
             colors: 颜色列表
+            inplace: 是否直接在输入图像上绘制
         
         Returns:
             绘制了边界框的图像
         """
-        result_image = image.copy()
+        result_image = image if inplace else image.copy()
         
         # 默认颜色
         if colors is None:
@@ -7,7 +7,83 @@
 
 import math
 import numpy as np
-from typing import List, Tuple, Union
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
+
+# 可选的C扩展加速（通过 scripts/build_math_ext.py 构建），未构建时使用NumPy实现
+try:
+    from . import _math_ext
+except ImportError:
+    _math_ext = None
+
+
+@lru_cache(maxsize=None)
+def _cuda_backend() -> Optional[str]:
+    """检测可用的GPU后端（延迟导入，避免在CPU环境下加载torch/cupy）"""
+    try:
+        import torch
+        import torchvision  # noqa: F401
+        if torch.cuda.is_available():
+            return 'torch'
+    except ImportError:
+        pass
+    try:
+        import cupy
+        if cupy.cuda.runtime.getDeviceCount() > 0:
+            return 'cupy'
+    except Exception:
+        pass
+    return None
+
+
+@lru_cache(maxsize=8)
+def _inv_wh(img_width: int, img_height: int) -> Tuple[float, float]:
+    """缓存图像宽高的倒数（图像尺寸在流水线中基本固定）"""
+    return 1.0 / img_width, 1.0 / img_height
+
+
+@lru_cache(maxsize=8)
+def _inv_wh_vector(img_width: int, img_height: int) -> np.ndarray:
+    """缓存批量归一化使用的 [1/W, 1/H, 1/W, 1/H] 缩放向量"""
+    inv_w, inv_h = _inv_wh(img_width, img_height)
+    scale = np.array([inv_w, inv_h, inv_w, inv_h], dtype=np.float32)
+    scale.flags.writeable = False
+    return scale
+
+
+@dataclass
+class BoxesSoA:
+    """边界框集合（按列存储 x1, y1, x2, y2 与面积）"""
+    x1: np.ndarray
+    y1: np.ndarray
+    x2: np.ndarray
+    y2: np.ndarray
+    area: np.ndarray
+    
+    def __len__(self) -> int:
+        return len(self.x1)
+    
+    @classmethod
+    def from_xyxy(cls, boxes: Union[np.ndarray, List[List[float]]],
+                  dtype: np.dtype = np.float32) -> 'BoxesSoA':
+        """从 (N, 4) [x1, y1, x2, y2] 数组创建，并预先计算面积"""
+        boxes = np.asarray(boxes, dtype=dtype).reshape(-1, 4)
+        x1 = np.ascontiguousarray(boxes[:, 0])
+        y1 = np.ascontiguousarray(boxes[:, 1])
+        x2 = np.ascontiguousarray(boxes[:, 2])
+        y2 = np.ascontiguousarray(boxes[:, 3])
+        return cls(x1, y1, x2, y2, (x2 - x1) * (y2 - y1))
+    
+    def as_xyxy(self) -> np.ndarray:
+        """转换回 (N, 4) [x1, y1, x2, y2] 数组"""
+        return np.stack([self.x1, self.y1, self.x2, self.y2], axis=1)
+    
+    def take(self, indices: np.ndarray) -> 'BoxesSoA':
+        """按索引选取子集"""
+        return BoxesSoA(self.x1[indices], self.y1[indices],
+                        self.x2[indices], self.y2[indices],
+                        self.area[indices])
 
 
 class MathUtils:
@@ -56,42 +132,269 @@ class MathUtils:
     def non_max_suppression(boxes: List[List[float]], 
                            scores: List[float],
                            score_threshold: float = 0.5,
-                           iou_threshold: float = 0.4) -> List[int]:
+                           iou_threshold: float = 0.4,
+                           dtype: np.dtype = np.float32,
+                           device: str = 'cpu',
+                           mode: str = 'hard',
+                           sigma: float = 0.5) -> np.ndarray:
         """
         非极大值抑制 (Non-Maximum Suppression)
         
         Args:
-            boxes: 边界框列表
+            boxes: 边界框列表（device为cuda时也可直接传入torch张量）
             scores: 置信度分数列表
             score_threshold: 置信度阈值
             iou_threshold: IoU阈值
+            dtype: 计算精度，默认float32
+            device: 计算设备，'cuda' 时优先使用 torchvision / CuPy，不可用则回退到CPU
+            mode: 抑制方式，'hard' 为标准NMS，'linear' / 'gaussian' 为Soft-NMS（仅CPU）
+            sigma: gaussian 模式的衰减系数
         
         Returns:
-            保留的边界框索引列表
+            保留的边界框索引数组 (int32)，可直接用于NumPy花式索引
+        """
+        if len(boxes) == 0 or len(scores) == 0:
+            return np.empty(0, dtype=np.int32)
+        
+        if mode == 'hard' and device.startswith('cuda') and _cuda_backend() is not None:
+            return MathUtils._nms_cuda(boxes, scores, score_threshold,
+                                       iou_threshold, device)
+        
+        return MathUtils.nms(BoxesSoA.from_xyxy(boxes, dtype), scores,
+                             score_threshold, iou_threshold, dtype, mode, sigma)
+    
+    @staticmethod
+    def _nms_cuda(boxes, scores, score_threshold: float,
+                  iou_threshold: float, device: str) -> np.ndarray:
+        """在GPU上执行非极大值抑制，返回保留的索引数组"""
+        if _cuda_backend() == 'torch':
+            import torch
+            import torchvision
+            boxes_t = torch.as_tensor(boxes, dtype=torch.float32, device=device).reshape(-1, 4)
+            scores_t = torch.as_tensor(scores, device=device).reshape(-1)
+            candidates = torch.nonzero(scores_t >= score_threshold).flatten()
+            keep = torchvision.ops.nms(boxes_t[candidates],
+                                       scores_t[candidates].float(),
+                                       iou_threshold)
+            return candidates[keep].cpu().numpy().astype(np.int32)
+        
+        import cupy as cp
+        boxes_c = cp.asarray(boxes, dtype=cp.float32).reshape(-1, 4)
+        x1, y1, x2, y2 = (cp.ascontiguousarray(boxes_c[:, k]) for k in range(4))
+        areas = (x2 - x1) * (y2 - y1)
+        scores_c = cp.asarray(scores).reshape(-1)
+        
+        indices = cp.flatnonzero(scores_c >= score_threshold)
+        indices = indices[cp.argsort(-scores_c[indices])]
+        
+        keep = np.empty(indices.size, dtype=np.int32)
+        kept = 0
+        while indices.size > 0:
+            current = int(indices[0])
+            keep[kept] = current
+            kept += 1
+            rest = indices[1:]
+            
+            inter_w = cp.minimum(x2[current], x2[rest]) - cp.maximum(x1[current], x1[rest])
+            inter_h = cp.minimum(y2[current], y2[rest]) - cp.maximum(y1[current], y1[rest])
+            intersection = cp.maximum(inter_w, 0) * cp.maximum(inter_h, 0)
+            union = areas[current] + areas[rest] - intersection
+            iou = cp.where(union > 0, intersection / cp.where(union > 0, union, 1), 0)
+            indices = rest[iou <= iou_threshold]
+        
+        return keep[:kept]
+    
+    @staticmethod
+    def _ext_compatible(*boxes_list: BoxesSoA) -> bool:
+        """检查边界框列是否满足C扩展的要求（float32且内存连续）"""
+        for boxes in boxes_list:
+            for column in (boxes.x1, boxes.y1, boxes.x2, boxes.y2, boxes.area):
+                if column.dtype != np.float32 or not column.flags.c_contiguous:
+                    return False
+        return True
+    
+    @staticmethod
+    def box_iou(boxes1: Union[BoxesSoA, np.ndarray],
+                boxes2: Union[BoxesSoA, np.ndarray],
+                dtype: np.dtype = np.float32) -> np.ndarray:
         """
-        if not boxes or not scores:
-            return []
+        批量计算两组边界框之间的IoU矩阵
         
-        # 过滤低置信度的框
-        indices = [i for i, score in enumerate(scores) if score >= score_threshold]
+        Args:
+            boxes1: 边界框集合1，BoxesSoA 或 (N, 4) [x1, y1, x2, y2] 数组
+            boxes2: 边界框集合2，BoxesSoA 或 (M, 4) [x1, y1, x2, y2] 数组
+            dtype: 数组输入的计算精度，默认float32，需要更高精度时可传入np.float64
+        
+        Returns:
+            IoU矩阵 (N, M)
+        """
+        if not isinstance(boxes1, BoxesSoA):
+            boxes1 = BoxesSoA.from_xyxy(boxes1, dtype)
+        if not isinstance(boxes2, BoxesSoA):
+            boxes2 = BoxesSoA.from_xyxy(boxes2, dtype)
+        
+        if _math_ext is not None and MathUtils._ext_compatible(boxes1, boxes2):
+            return _math_ext.iou_matrix(boxes1, boxes2)
+        
+        # 按坐标轴计算重叠长度，(N, M) 中间结果均原地复用
+        intersection = np.minimum.outer(boxes1.x2, boxes2.x2)
+        intersection -= np.maximum.outer(boxes1.x1, boxes2.x1)
+        np.maximum(intersection, 0, out=intersection)
+        overlap_h = np.minimum.outer(boxes1.y2, boxes2.y2)
+        overlap_h -= np.maximum.outer(boxes1.y1, boxes2.y1)
+        np.maximum(overlap_h, 0, out=overlap_h)
+        intersection *= overlap_h
+        
+        # 计算并集面积（复用 overlap_h 的缓冲区）
+        union = np.add.outer(boxes1.area, boxes2.area, out=overlap_h)
+        union -= intersection
+        
+        # 避免除零
+        np.divide(intersection, union, out=intersection, where=union > 0)
+        intersection[union <= 0] = 0
+        return intersection
+    
+    @staticmethod
+    def iou_gt(boxes1: Union[BoxesSoA, np.ndarray],
+               boxes2: Union[BoxesSoA, np.ndarray],
+               threshold: float,
+               dtype: np.dtype = np.float32) -> np.ndarray:
+        """
+        判断两组边界框之间的IoU是否大于阈值（不计算IoU矩阵本身）
+        
+        Args:
+            boxes1: 边界框集合1，BoxesSoA 或 (N, 4) [x1, y1, x2, y2] 数组
+            boxes2: 边界框集合2，BoxesSoA 或 (M, 4) [x1, y1, x2, y2] 数组
+            threshold: IoU阈值
+            dtype: 数组输入的计算精度，默认float32
+        
+        Returns:
+            布尔矩阵 (N, M)，IoU > threshold 处为 True
+        """
+        if not isinstance(boxes1, BoxesSoA):
+            boxes1 = BoxesSoA.from_xyxy(boxes1, dtype)
+        if not isinstance(boxes2, BoxesSoA):
+            boxes2 = BoxesSoA.from_xyxy(boxes2, dtype)
+        
+        intersection = np.minimum.outer(boxes1.x2, boxes2.x2)
+        intersection -= np.maximum.outer(boxes1.x1, boxes2.x1)
+        np.maximum(intersection, 0, out=intersection)
+        overlap_h = np.minimum.outer(boxes1.y2, boxes2.y2)
+        overlap_h -= np.maximum.outer(boxes1.y1, boxes2.y1)
+        np.maximum(overlap_h, 0, out=overlap_h)
+        intersection *= overlap_h
+        
+        # inter / union > threshold 改写为 inter > threshold * union，避免除法
+        union = np.add.outer(boxes1.area, boxes2.area, out=overlap_h)
+        union -= intersection
+        mask = union > 0
+        union *= threshold
+        mask &= intersection > union
+        return mask
+    
+    @staticmethod
+    def nms(boxes: Union[BoxesSoA, np.ndarray],
+            scores: np.ndarray,
+            score_threshold: float = 0.5,
+            iou_threshold: float = 0.4,
+            dtype: np.dtype = np.float32,
+            mode: str = 'hard',
+            sigma: float = 0.5) -> np.ndarray:
+        """
+        向量化的非极大值抑制
+        
+        Args:
+            boxes: 边界框集合，BoxesSoA 或 (N, 4) [x1, y1, x2, y2] 数组
+            scores: 置信度分数数组 (N,)
+            score_threshold: 置信度阈值
+            iou_threshold: IoU阈值
+            dtype: 计算精度，默认float32，需要更高精度时可传入np.float64
+            mode: 抑制方式，'hard' 为标准NMS，'linear' / 'gaussian' 为Soft-NMS
+            sigma: gaussian 模式的衰减系数
+        
+        Returns:
+            保留的边界框索引数组 (int32，按选取顺序)
+        """
+        if mode not in ('hard', 'linear', 'gaussian'):
+            raise ValueError(f"不支持的NMS模式: {mode}")
         
-        if not indices:
-            return []
+        if not isinstance(boxes, BoxesSoA):
+            boxes = BoxesSoA.from_xyxy(boxes, dtype)
+        scores = np.asarray(scores).reshape(-1)
         
-        # 按置信度降序排序
-        indices.sort(key=lambda i: scores[i], reverse=True)
+        if mode != 'hard':
+            return MathUtils._soft_nms(boxes, scores, score_threshold,
+                                       iou_threshold, mode, sigma)
         
-        keep = []
-        while indices:
+        # 过滤低置信度的框，并按置信度降序排序
+        indices = np.flatnonzero(scores >= score_threshold)
+        indices = indices[np.argsort(-scores[indices], kind='stable')]
+        
+        if _math_ext is not None and MathUtils._ext_compatible(boxes):
+            return _math_ext.nms(boxes, indices, iou_threshold)
+        
+        # 面积在 BoxesSoA 中只计算一次，循环内直接复用
+        x1, y1, x2, y2, areas = boxes.x1, boxes.y1, boxes.x2, boxes.y2, boxes.area
+        
+        keep = np.empty(indices.size, dtype=np.int32)
+        kept = 0
+        while indices.size > 0:
             # 取置信度最高的框
-            current = indices.pop(0)
-            keep.append(current)
+            current = indices[0]
+            keep[kept] = current
+            kept += 1
+            rest = indices[1:]
             
             # 计算与其他框的IoU，移除重叠度高的框
-            indices = [i for i in indices 
-                      if MathUtils.calculate_iou(boxes[current], boxes[i]) <= iou_threshold]
+            intersection, union = MathUtils._overlap_with(boxes, current, rest)
+            
+            # IoU > 阈值 等价于 交集 > 阈值 * 并集，省去除法
+            suppressed = (intersection > iou_threshold * union) & (union > 0)
+            indices = rest[~suppressed]
+        
+        return keep[:kept]
+    
+    @staticmethod
+    def _overlap_with(boxes: BoxesSoA, current: int,
+                      rest: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """计算框 current 与 rest 中各框的交集面积和并集面积"""
+        inter_w = np.minimum(boxes.x2[current], boxes.x2[rest]) - np.maximum(boxes.x1[current], boxes.x1[rest])
+        inter_h = np.minimum(boxes.y2[current], boxes.y2[rest]) - np.maximum(boxes.y1[current], boxes.y1[rest])
+        intersection = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+        union = boxes.area[current] + boxes.area[rest] - intersection
+        return intersection, union
+    
+    @staticmethod
+    def _soft_nms(boxes: BoxesSoA, scores: np.ndarray,
+                  score_threshold: float, iou_threshold: float,
+                  mode: str, sigma: float) -> np.ndarray:
+        """Soft-NMS：按IoU衰减重叠框的分数，而不是直接移除"""
+        scores = scores.astype(np.float64)
+        indices = np.flatnonzero(scores >= score_threshold)
+        
+        keep = np.empty(indices.size, dtype=np.int32)
+        kept = 0
+        while indices.size > 0:
+            # 取当前分数最高的框（并列时取索引最小者）
+            top = int(np.argmax(scores[indices]))
+            current = indices[top]
+            keep[kept] = current
+            kept += 1
+            rest = np.delete(indices, top)
+            
+            # 按IoU衰减其余框的分数
+            intersection, union = MathUtils._overlap_with(boxes, current, rest)
+            iou = np.zeros_like(intersection)
+            np.divide(intersection, union, out=iou, where=union > 0)
+            if mode == 'linear':
+                scores[rest] *= np.where(iou > iou_threshold, 1 - iou, 1)
+            else:
+                scores[rest] *= np.exp(-(iou * iou) / sigma)
+            
+            # 丢弃分数低于阈值的框
+            indices = rest[scores[rest] >= score_threshold]
         
-        return keep
+        return keep[:kept]
     
     @staticmethod
     def calculate_distance(point1: Tuple[float, float], 
@@ -106,9 +409,9 @@ class MathUtils:
         Returns:
             距离值
         """
-        x1, y1 = point1
-        x2, y2 = point2
-        return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+        dx = point2[0] - point1[0]
+        dy = point2[1] - point1[1]
+        return math.sqrt(dx * dx + dy * dy)
     
     @staticmethod
     def calculate_angle(point1: Tuple[float, float],
@@ -125,18 +428,16 @@ class MathUtils:
         Returns:
             角度值（弧度）
         """
-        x1, y1 = point1
-        x2, y2 = point2
-        x3, y3 = point3
-        
         # 计算向量
-        vec1 = (x1 - x2, y1 - y2)
-        vec2 = (x3 - x2, y3 - y2)
+        ax = point1[0] - point2[0]
+        ay = point1[1] - point2[1]
+        bx = point3[0] - point2[0]
+        by = point3[1] - point2[1]
         
         # 计算点积和模长
-        dot_product = vec1[0] * vec2[0] + vec1[1] * vec2[1]
-        norm1 = math.sqrt(vec1[0] ** 2 + vec1[1] ** 2)
-        norm2 = math.sqrt(vec2[0] ** 2 + vec2[1] ** 2)
+        dot_product = ax * bx + ay * by
+        norm1 = math.sqrt(ax * ax + ay * ay)
+        norm2 = math.sqrt(bx * bx + by * by)
         
         # 避免除零
         if norm1 == 0 or norm2 == 0:
@@ -176,6 +477,20 @@ class MathUtils:
         x1, y1, x2, y2 = box
         return max(0, x2 - x1) * max(0, y2 - y1)
     
+    @staticmethod
+    def box_areas_batch(boxes: np.ndarray) -> np.ndarray:
+        """
+        批量计算边界框面积
+        
+        Args:
+            boxes: 边界框数组 (N, 4) [x1, y1, x2, y2]
+        
+        Returns:
+            面积数组 (N,)
+        """
+        boxes = np.asarray(boxes)
+        return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    
     @staticmethod
     def xywh_to_xyxy(box: List[float]) -> List[float]:
         """
@@ -212,6 +527,39 @@ class MathUtils:
         height = y2 - y1
         return [x_center, y_center, width, height]
     
+    @staticmethod
+    def xywh_to_xyxy_batch(boxes: np.ndarray) -> np.ndarray:
+        """
+        批量将YOLO格式的边界框转换为标准格式
+        
+        Args:
+            boxes: YOLO格式边界框数组 (N, 4) [x_center, y_center, width, height]
+        
+        Returns:
+            标准格式边界框数组 (N, 4) [x1, y1, x2, y2]
+        """
+        boxes = np.asarray(boxes)
+        x_center, y_center = boxes[:, 0], boxes[:, 1]
+        half_w, half_h = boxes[:, 2] * 0.5, boxes[:, 3] * 0.5
+        return np.stack([x_center - half_w, y_center - half_h,
+                         x_center + half_w, y_center + half_h], axis=1)
+    
+    @staticmethod
+    def xyxy_to_xywh_batch(boxes: np.ndarray) -> np.ndarray:
+        """
+        批量将标准格式的边界框转换为YOLO格式
+        
+        Args:
+            boxes: 标准格式边界框数组 (N, 4) [x1, y1, x2, y2]
+        
+        Returns:
+            YOLO格式边界框数组 (N, 4) [x_center, y_center, width, height]
+        """
+        boxes = np.asarray(boxes)
+        x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+        return np.stack([(x1 + x2) * 0.5, (y1 + y2) * 0.5,
+                         x2 - x1, y2 - y1], axis=1)
+    
     @staticmethod
     def normalize_box(box: List[float], 
                      img_width: int, 
@@ -227,11 +575,12 @@ class MathUtils:
         Returns:
             归一化的边界框坐标
         """
+        inv_w, inv_h = _inv_wh(img_width, img_height)
         return [
-            box[0] / img_width,
-            box[1] / img_height,
-            box[2] / img_width,
-            box[3] / img_height
+            box[0] * inv_w,
+            box[1] * inv_h,
+            box[2] * inv_w,
+            box[3] * inv_h
         ]
     
     @staticmethod
@@ -256,6 +605,23 @@ class MathUtils:
             box[3] * img_height
         ]
     
+    @staticmethod
+    def normalize_boxes_batch(boxes: np.ndarray,
+                              img_width: int,
+                              img_height: int) -> np.ndarray:
+        """
+        批量归一化边界框坐标
+        
+        Args:
+            boxes: 边界框坐标数组 (N, 4)
+            img_width: 图像宽度
+            img_height: 图像高度
+        
+        Returns:
+            归一化的边界框坐标数组 (N, 4)，float32
+        """
+        return np.asarray(boxes, dtype=np.float32) * _inv_wh_vector(img_width, img_height)
+    
     @staticmethod
     def smooth_coordinates(coords_history: List[Tuple[float, float]],
                           alpha: float = 0.8) -> Tuple[float, float]:
@@ -5,6 +5,6 @@ Web界面模块
 提供基于Flask的Web服务和API接口
 """
 
-from .app import create_app
+from .app import create_app, create_asgi_app
 
-__all__ = ["create_app"] 
\ No newline at end of file
+__all__ = ["create_app", "create_asgi_app"] 
\ No newline at end of file
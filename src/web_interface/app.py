@@ -5,37 +5,7 @@ Flask Web应用主文件
 垃圾分拣系统的Web界面
 """
 
-# ===== 修复PyTorch 2.6权重加载问题 =====
-import os
-os.environ['TORCH_WEIGHTS_ONLY'] = 'False'
-
-import torch
-# 全局修复torch.load函数
-if not hasattr(torch, '_original_load'):
-    torch._original_load = torch.load
-    
-    def patched_torch_load(*args, **kwargs):
-        # 移除weights_only参数并强制设为False
-        kwargs.pop('weights_only', None)
-        return torch._original_load(*args, weights_only=False, **kwargs)
-    
-    torch.load = patched_torch_load
-
-# 添加安全全局变量
-if hasattr(torch, 'serialization'):
-    try:
-        torch.serialization.add_safe_globals([
-            'ultralytics.nn.tasks.DetectionModel',
-            'ultralytics.nn.modules.block.C2f',
-            'ultralytics.nn.modules.block.SPPF', 
-            'ultralytics.nn.modules.conv.Conv',
-            'ultralytics.nn.modules.head.Detect'
-        ])
-    except Exception:
-        pass
-
-print("🔧 PyTorch权重加载修复已应用到Flask应用")
-# ===== 修复结束 =====
+# PyTorch 2.6 权重加载修复（torch.load 补丁与安全全局变量）在 models.detector 中统一应用
 
 import sys
 import logging
@@ -44,21 +14,132 @@ from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import cv2
 import numpy as np
+import json
+import gzip
 import base64
+import hashlib
 import threading
 import time
+import asyncio
+import queue
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+# xxhash 为可选依赖，不可用时回退到 hashlib.blake2b
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# flask-compress 为可选依赖，不可用时JSON响应不压缩
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+# hypercorn 为可选依赖，用其WSGI中间件在ASGI服务器下挂载Flask应用
+# （每个请求在线程池中执行，不会像 asgiref.WsgiToAsgi 那样串行化到单个线程）
+try:
+    from hypercorn.middleware import AsyncioWSGIMiddleware
+except ImportError:
+    AsyncioWSGIMiddleware = None
+
+# orjson 为可选依赖（需要 Flask 2.2+ 的 JSON Provider 接口），不可用时使用Flask默认的json
+try:
+    import orjson
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    class OrjsonJSONProvider(DefaultJSONProvider):
+        """基于orjson的JSON序列化，支持直接序列化NumPy数组"""
+        
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        
+        def dumps(self, obj, **kwargs):
+            # orjson 不支持 indent 等参数，仅保留 default 回调
+            return orjson.dumps(obj, default=kwargs.get('default', self.default),
+                                option=self.option).decode('utf-8')
+        
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+else:
+    OrjsonJSONProvider = None
+
+# API根路径返回的静态系统信息，启动时序列化一次
+ROOT_INFO = {
+    'name': 'SmartBin 垃圾分拣系统 API',
+    'version': '1.0.0',
+    'description': '智能垃圾分拣系统后端API',
+    'status': 'running',
+    'endpoints': {
+        'status': '/api/status',
+        'detection': '/api/detect_image',
+        'video_feed': '/video_feed',
+        'model_load': '/api/load_model',
+        'training': '/api/start_training',
+        'start_detection': '/api/start_detection',
+        'stop_detection': '/api/stop_detection',
+        'robot_arm': {
+            'grab': '/api/robot_arm/grab',
+            'status': '/api/robot_arm/status',
+            'home': '/api/robot_arm/home',
+            'emergency_stop': '/api/robot_arm/emergency_stop',
+            'statistics': '/api/robot_arm/statistics',
+            'reset_stats': '/api/robot_arm/reset_stats',
+            'test_sort': '/api/robot_arm/test_sort/<garbage_type>'
+        }
+    },
+    'frontend_url': 'http://localhost:3000'
+}
+_ROOT_RESPONSE_BODY = (orjson.dumps(ROOT_INFO) if orjson is not None
+                       else json.dumps(ROOT_INFO, ensure_ascii=False).encode('utf-8'))
+
+# 视频流multipart分段的固定头尾，带Content-Length便于浏览器无需扫描边界即可取出整帧
+_FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+_FRAME_TAIL = b'\r\n'
+
+# X-Detections 响应头的最大长度，超过时改用JSON响应体（nginx等代理默认响应头上限为4-8KB）
+DETECTIONS_HEADER_LIMIT = 4000
 
 # 添加项目根目录到Python路径
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from ..utils.config_loader import config_loader
+from ..utils.image_utils import ImageProcessor
 from ..models.detector import GarbageDetector
 from ..models.trainer import ModelTrainer
 from ..hardware.camera import CameraController
 from ..system.controller import SystemController
 
 
+@lru_cache(maxsize=32)
+def _arm_available(arm_type: str) -> bool:
+    """
+    检查机械臂类型的可用性（结果缓存，驱动依赖缺失时不再尝试创建实例）
+    
+    Args:
+        arm_type: 机械臂类型
+    
+    Returns:
+        是否可用
+    """
+    from ..hardware.robot_arm_interface import AVAILABLE_ARM_TYPES, create_robot_arm
+    
+    if arm_type.lower() not in AVAILABLE_ARM_TYPES:
+        return False
+    try:
+        # 尝试创建实例来检查可用性
+        test_instance = create_robot_arm(arm_type, {'test_mode': True})
+        return test_instance is not None
+    except Exception:
+        return False
+
+
 class WebApp:
     """Web应用类"""
     
@@ -66,6 +147,7 @@ class WebApp:
         self.app = Flask(__name__)
         self.setup_config()
         self.setup_cors()
+        self.setup_compression()
         self.setup_logging()
         
         # 初始化组件
@@ -79,9 +161,41 @@ class WebApp:
         self.detection_active = False
         self.training_active = False
         
+        # 图像检测结果缓存（按上传内容哈希），重复上传时跳过推理
+        self._detect_cache = OrderedDict()
+        self._detect_cache_lock = threading.Lock()
+        self._detect_cache_size = 128
+        
+        # 机械臂统计接口的gzip响应缓存: ((机械臂实例ID, 历史版本号), 压缩后的字节)
+        self._stats_cache = None
+        
+        # 视频流：生产者线程检测并编码最新帧，所有 /video_feed 客户端共享
+        self._frame_cv = threading.Condition()
+        self._latest_part = None
+        self._latest_seq = 0
+        self._encode_thread = None
+        # 每个生产者线程独占的停止事件；启停之间用锁串行化
+        self._encode_stop = None
+        self._encode_lock = threading.Lock()
+        
+        # ASGI视频流客户端在事件循环中等待的新帧事件（每帧替换一次）
+        self._frame_loop = None
+        self._frame_event = asyncio.Event()
+        
+        # 上传读取缓冲区共享池：异步视图每次请求都在新线程中执行，线程局部缓冲区无法复用，
+        # 改为请求间借还（池大小即同时处理的上传数）
+        self._upload_pool = queue.SimpleQueue()
+        
+        # 图像编解码与模型推理分别使用独立线程池，避免推理占满时阻塞解码
+        self._decode_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='decode')
+        self._infer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='infer')
+        
         # 初始化虚拟机械臂
         self.setup_robot_arm()
         
+        # 机械臂类型列表（静态信息 + 可用性）及其序列化响应，仅在切换机械臂类型后重新计算
+        self._refresh_types_response()
+        
         # 自动加载默认模型
         self.load_default_model()
         
@@ -96,6 +210,18 @@ class WebApp:
         self.app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
         self.app.config['UPLOAD_FOLDER'] = 'uploads'
         
+        # 视频流JPEG质量与每个客户端的最大帧率
+        self.stream_jpeg_quality = int(web_config.get('jpeg_quality', 80))
+        self.stream_fps = float(web_config.get('stream_fps', 30))
+        
+        # 视频流批量推理：最多合并的帧数与合并等待窗口（秒）
+        self.stream_batch_size = max(int(web_config.get('stream_batch_size', 4)), 1)
+        self.stream_batch_window = float(web_config.get('stream_batch_window_ms', 15)) / 1000.0
+        
+        # 使用orjson加速jsonify响应的序列化
+        if OrjsonJSONProvider is not None:
+            self.app.json = OrjsonJSONProvider(self.app)
+        
         # 创建上传目录
         upload_dir = Path(self.app.config['UPLOAD_FOLDER'])
         upload_dir.mkdir(exist_ok=True)
@@ -106,8 +232,21 @@ class WebApp:
              origins=["*"],  # 开发环境允许所有域名
              methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
              allow_headers=["Content-Type", "Authorization", "Access-Control-Allow-Origin"],
+             expose_headers=["X-Detections"],  # 图像检测接口通过该响应头返回检测结果
              supports_credentials=False)  # 设为False避免某些浏览器限制
     
+    def setup_compression(self):
+        """设置响应压缩 - 只压缩文本类响应，视频流和JPEG图像不压缩"""
+        if Compress is None:
+            return
+        self.app.config['COMPRESS_MIMETYPES'] = [
+            'application/json',
+            'text/html',
+            'text/css',
+            'application/javascript'
+        ]
+        Compress(self.app)
+    
     def setup_logging(self):
         """设置日志"""
         log_dir = Path('logs')
@@ -188,37 +327,12 @@ class WebApp:
         @self.app.route('/')
         def api_root():
             """API根路径 - 返回系统信息"""
-            return jsonify({
-                'name': 'SmartBin 垃圾分拣系统 API',
-                'version': '1.0.0',
-                'description': '智能垃圾分拣系统后端API',
-                'status': 'running',
-                'endpoints': {
-                    'status': '/api/status',
-                    'detection': '/api/detect_image',
-                    'video_feed': '/video_feed',
-                    'model_load': '/api/load_model',
-                    'training': '/api/start_training',
-                    'start_detection': '/api/start_detection',
-                    'stop_detection': '/api/stop_detection',
-                    'robot_arm': {
-                        'grab': '/api/robot_arm/grab',
-                        'status': '/api/robot_arm/status',
-                        'home': '/api/robot_arm/home',
-                        'emergency_stop': '/api/robot_arm/emergency_stop',
-                        'statistics': '/api/robot_arm/statistics',
-                        'reset_stats': '/api/robot_arm/reset_stats',
-                        'test_sort': '/api/robot_arm/test_sort/<garbage_type>'
-                    }
-                },
-                'frontend_url': 'http://localhost:3000'
-            })
+            return Response(_ROOT_RESPONSE_BODY, mimetype='application/json')
         
         # API路由
         @self.app.route('/api/status')
         def api_status():
             """获取系统状态"""
-            import traceback
             try:
                 status = {
                     'detector_loaded': self.detector is not None and self.detector.model is not None,
@@ -232,8 +346,7 @@ class WebApp:
                     else:
                         status['robot_arm_connected'] = False
                 except Exception as arm_conn_e:
-                    self.logger.error(f"获取机械臂连接状态失败: {arm_conn_e}")
-                    self.logger.error(f"详细错误: {traceback.format_exc()}")
+                    self.logger.exception(f"获取机械臂连接状态失败: {arm_conn_e}")
                     status['robot_arm_connected'] = False
                 
                 status['system_ready'] = True
@@ -244,14 +357,12 @@ class WebApp:
                         arm_status = self.robot_arm.get_status()
                         status['robot_arm_status'] = arm_status
                 except Exception as arm_status_e:
-                    self.logger.error(f"获取机械臂状态失败: {arm_status_e}")
-                    self.logger.error(f"详细错误: {traceback.format_exc()}")
+                    self.logger.exception(f"获取机械臂状态失败: {arm_status_e}")
                     status['robot_arm_status'] = {'error': str(arm_status_e)}
                 
                 return jsonify(status)
             except Exception as e:
-                self.logger.error(f"获取状态失败: {e}")
-                self.logger.error(f"完整错误堆栈: {traceback.format_exc()}")
+                self.logger.exception(f"获取状态失败: {e}")
                 return jsonify({'error': str(e)}), 500
         
         @self.app.route('/api/load_model', methods=['POST'])
@@ -268,11 +379,21 @@ class WebApp:
                 if not Path(model_path).exists():
                     return jsonify({'error': f'模型文件不存在: {model_path}'}), 400
                 
-                self.detector = GarbageDetector(model_path)
+                # 在子进程中反序列化权重，避免反复切换模型时Flask进程内存持续增长
+                detector = GarbageDetector(model_path, load_in_subprocess=True)
+                
+                # 可选：INT8量化（CUDA可用时为TensorRT INT8引擎，最大batch与视频流凑批一致）
+                quantized = False
+                if data.get('quantize'):
+                    quantized = detector.quantize_int8(max_batch=self.stream_batch_size)
+                
+                self.detector = detector
+                self._clear_detect_cache()
                 
                 return jsonify({
                     'success': True,
-                    'message': f'模型 {model_path} 加载成功'
+                    'message': f'模型 {model_path} 加载成功',
+                    'quantized': quantized
                 })
                 
             except Exception as e:
@@ -280,60 +401,98 @@ class WebApp:
                 return jsonify({'error': str(e)}), 500
         
         @self.app.route('/api/detect_image', methods=['POST'])
-        def api_detect_image():
-            """检测上传的图像"""
+        async def api_detect_image():
+            """
+            检测上传的图像（异步视图，需要 flask[async]）
+            
+            成功时响应体为标注后的JPEG图像 (image/jpeg)，
+            检测结果以JSON形式放在 X-Detections 响应头中：
+            {success, results, total_detections, category_counts}；
+            检测结果过多、响应头超出代理限制时改为JSON响应体，标注图像以base64放在 image 字段
+            
+            传入 ?image=0 时不绘制和编码图像，直接以JSON响应体返回检测结果（实时检测轮询使用）；
+            相同内容的图像直接返回缓存结果，传入 ?nocache=1 可强制重新检测
+            """
+            upload_buf = None
             try:
                 if 'image' not in request.files:
                     return jsonify({'error': '没有上传图像'}), 400
                 
-                if self.detector is None:
+                detector = self.detector
+                if detector is None:
                     return jsonify({'error': '检测模型未加载'}), 400
                 
                 file = request.files['image']
                 if file.filename == '':
                     return jsonify({'error': '文件名为空'}), 400
                 
-                # 读取图像
-                file_bytes = np.frombuffer(file.read(), np.uint8)
-                image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+                # 读取图像到共享池借出的缓冲区，先按内容哈希查询缓存，未命中时再解码
+                upload_buf = self._acquire_upload_buffer()
+                raw_bytes = self._read_upload(file, upload_buf)
+                use_cache = request.args.get('nocache') != '1'
+                want_image = request.args.get('image') != '0'
+                cache_key = self._content_hash(raw_bytes)
+                if use_cache:
+                    cached = self._get_cached_detection(cache_key)
+                    # 只缓存了检测结果（未编码图像）时，需要图像的请求重新检测
+                    if cached is not None and (cached[0] is not None or not want_image):
+                        return self._detection_response(*cached, include_image=want_image)
+                
+                loop = asyncio.get_running_loop()
+                
+                # 大尺寸JPEG按模型输入尺寸降采样解码，减少解码与缩放开销；
+                # 返回的边框需乘以缩小倍数还原到原图坐标（前端按原始分辨率绘制和计算抓取点）
+                image, reduction = await loop.run_in_executor(
+                    self._decode_pool, ImageProcessor.decode_image, raw_bytes, detector.input_size)
                 
                 if image is None:
                     return jsonify({'error': '无法解码图像'}), 400
                 
-                # 执行检测
-                result_image, detection_results = self.detector.detect_and_draw(image)
-                
-                # 转换为base64
-                _, buffer = cv2.imencode('.jpg', result_image)
-                img_base64 = base64.b64encode(buffer).decode('utf-8')
-                
-                # 转换检测结果格式以匹配前端期望
-                formatted_results = []
-                if 'detections' in detection_results:
-                    for detection in detection_results['detections']:
-                        formatted_results.append({
-                            'class': detection['class_name'],
-                            'confidence': detection['confidence'],
-                            'bbox': [
-                                detection['bbox']['x1'],
-                                detection['bbox']['y1'], 
-                                detection['bbox']['x2'],
-                                detection['bbox']['y2']
-                            ],
-                            'category': detection['category']
-                        })
+                # 执行检测，需要图像时绘制并编码为JPEG
+                jpeg_bytes = None
+                if want_image:
+                    result_image, detection_results = await loop.run_in_executor(
+                        self._infer_pool, detector.detect_and_draw, image)
+                    jpeg_bytes = await loop.run_in_executor(
+                        self._decode_pool, ImageProcessor.encode_jpeg, result_image)
+                else:
+                    detection_results = await loop.run_in_executor(
+                        self._infer_pool, detector.detect, image)
+                
+                # 转换检测结果格式以匹配前端期望（直接使用检测器输出的数组）
+                boxes_xyxy = detection_results['boxes_xyxy']
+                if reduction != 1:
+                    boxes_xyxy = boxes_xyxy * reduction
+                boxes_list = boxes_xyxy.tolist()
+                confidences = detection_results['confidences'].tolist()
+                classes = detection_results['class_names']
+                categories = detection_results['categories']
+                formatted_results = [
+                    {
+                        'class': classes[i],
+                        'confidence': confidences[i],
+                        'bbox': boxes_list[i],
+                        'category': categories[i]
+                    }
+                    for i in range(len(classes))
+                ]
                 
-                return jsonify({
+                metadata = {
                     'success': True,
-                    'image': f'data:image/jpeg;base64,{img_base64}',
                     'results': formatted_results,
                     'total_detections': detection_results.get('total_detections', 0),
                     'category_counts': detection_results.get('category_counts', {})
-                })
+                }
+                self._put_cached_detection(cache_key, (jpeg_bytes, metadata))
+                
+                return self._detection_response(jpeg_bytes, metadata, include_image=want_image)
                 
             except Exception as e:
                 self.logger.error(f"图像检测失败: {e}")
                 return jsonify({'error': str(e)}), 500
+            finally:
+                if upload_buf is not None:
+                    self._upload_pool.put(upload_buf)
         
         @self.app.route('/api/start_detection')
         def api_start_detection():
@@ -349,6 +508,7 @@ class WebApp:
                     return jsonify({'error': '摄像头启动失败'}), 500
                 
                 self.detection_active = True
+                self._start_encode_loop()
                 
                 return jsonify({
                     'success': True,
@@ -364,6 +524,7 @@ class WebApp:
             """停止实时检测"""
             try:
                 self.detection_active = False
+                self._stop_encode_loop()
                 
                 if self.camera:
                     self.camera.stop()
@@ -455,44 +616,55 @@ class WebApp:
                 if not self.robot_arm.is_connected:
                     return jsonify({'error': '机械臂未连接'}), 400
                 
-                # 检查机械臂状态，确保不在执行其他操作
-                status = self.robot_arm.get_status()
-                current_status = status.get('status', 'unknown')
-                
-                if current_status != 'idle':
+                # 原子地占用机械臂，避免并发请求同时下发动作
+                if not self.robot_arm.try_reserve():
                     return jsonify({
-                        'error': f'机械臂正在执行操作，当前状态: {current_status}',
-                        'current_status': current_status,
+                        'error': '机械臂正在执行其他请求',
+                        'current_status': 'busy',
                         'message': '请等待当前操作完成后再试'
-                    }), 409  # 409 Conflict
-                
-                data = request.get_json()
-                target = data.get('target')
-                
-                if not target:
-                    return jsonify({'error': '缺少目标信息'}), 400
-                
-                self.logger.info(f"🎯 接收到抓取指令: {target}")
-                
-                # 执行抓取动作
-                success = self.robot_arm.grab_object(
-                    target_class=target['class'],
-                    confidence=target['confidence'],
-                    position=target['center'],
-                    bbox=target['bbox']
-                )
+                    }), 409
                 
-                if success:
-                    # 获取最新统计信息
-                    stats = self.robot_arm.get_statistics()
-                    return jsonify({
-                        'success': True,
-                        'message': f'机械臂成功抓取 {target["class"]}',
-                        'target': target,
-                        'statistics': stats
-                    })
-                else:
-                    return jsonify({'error': '机械臂执行失败'}), 500
+                try:
+                    # 检查机械臂状态，确保不在执行其他操作
+                    status = self.robot_arm.get_status()
+                    current_status = status.get('status', 'unknown')
+                    
+                    if current_status != 'idle':
+                        return jsonify({
+                            'error': f'机械臂正在执行操作，当前状态: {current_status}',
+                            'current_status': current_status,
+                            'message': '请等待当前操作完成后再试'
+                        }), 409  # 409 Conflict
+                    
+                    data = request.get_json()
+                    target = data.get('target')
+                    
+                    if not target:
+                        return jsonify({'error': '缺少目标信息'}), 400
+                    
+                    self.logger.info(f"🎯 接收到抓取指令: {target}")
+                    
+                    # 执行抓取动作
+                    success = self.robot_arm.grab_object(
+                        target_class=target['class'],
+                        confidence=target['confidence'],
+                        position=target['center'],
+                        bbox=target['bbox']
+                    )
+                    
+                    if success:
+                        # 获取最新统计信息
+                        stats = self.robot_arm.get_statistics()
+                        return jsonify({
+                            'success': True,
+                            'message': f'机械臂成功抓取 {target["class"]}',
+                            'target': target,
+                            'statistics': stats
+                        })
+                    else:
+                        return jsonify({'error': '机械臂执行失败'}), 500
+                finally:
+                    self.robot_arm.release_reservation()
                 
             except Exception as e:
                 self.logger.error(f"机械臂控制失败: {e}")
@@ -530,26 +702,37 @@ class WebApp:
                 if not self.robot_arm.is_connected:
                     return jsonify({'error': '机械臂未连接'}), 400
                 
-                # 检查机械臂状态（归位操作可以在大部分状态下执行，除了正在移动时）
-                status = self.robot_arm.get_status()
-                current_status = status.get('status', 'unknown')
-                
-                if current_status == 'moving':
+                # 原子地占用机械臂，避免并发请求同时下发动作
+                if not self.robot_arm.try_reserve():
                     return jsonify({
-                        'error': '机械臂正在移动中，无法执行归位操作',
-                        'current_status': current_status,
-                        'message': '请等待当前移动完成后再试'
+                        'error': '机械臂正在执行其他请求',
+                        'current_status': 'busy',
+                        'message': '请等待当前操作完成后再试'
                     }), 409
                 
-                success = self.robot_arm.home()
-                if success:
-                    return jsonify({
-                        'success': True,
-                        'message': '机械臂已归位'
-                    })
-                else:
-                    return jsonify({'error': '归位失败'}), 500
+                try:
+                    # 检查机械臂状态（归位操作可以在大部分状态下执行，除了正在移动时）
+                    status = self.robot_arm.get_status()
+                    current_status = status.get('status', 'unknown')
                     
+                    if current_status == 'moving':
+                        return jsonify({
+                            'error': '机械臂正在移动中，无法执行归位操作',
+                            'current_status': current_status,
+                            'message': '请等待当前移动完成后再试'
+                        }), 409
+                    
+                    success = self.robot_arm.home()
+                    if success:
+                        return jsonify({
+                            'success': True,
+                            'message': '机械臂已归位'
+                        })
+                    else:
+                        return jsonify({'error': '归位失败'}), 500
+                finally:
+                    self.robot_arm.release_reservation()
+                
             except Exception as e:
                 self.logger.error(f"机械臂归位失败: {e}")
                 return jsonify({'error': str(e)}), 500
@@ -581,6 +764,24 @@ class WebApp:
                 if self.robot_arm is None:
                     return jsonify({'error': '机械臂未初始化'}), 400
                 
+                # 客户端支持gzip且统计未变化时，直接返回缓存的压缩响应
+                version = self.robot_arm.history_version
+                if version is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+                    key = (self.robot_arm.connection_id, version)
+                    cached = self._stats_cache
+                    if cached is None or cached[0] != key:
+                        payload = {
+                            'statistics': self.robot_arm.get_statistics(),
+                            'operation_history': self.robot_arm.get_operation_history(20)
+                        }
+                        body = gzip.compress(self.app.json.dumps(payload).encode('utf-8'))
+                        cached = self._stats_cache = (key, body)
+                    
+                    response = Response(cached[1], mimetype='application/json')
+                    response.headers['Content-Encoding'] = 'gzip'
+                    response.headers['Vary'] = 'Accept-Encoding'
+                    return response
+                
                 stats = self.robot_arm.get_statistics()
                 history = self.robot_arm.get_operation_history(20)  # 最近20次操作
                 
@@ -623,30 +824,41 @@ class WebApp:
                 if not self.robot_arm.is_connected:
                     return jsonify({'error': '机械臂未连接'}), 400
                 
-                # 检查机械臂状态，确保不在执行其他操作
-                status = self.robot_arm.get_status()
-                current_status = status.get('status', 'unknown')
-                
-                if current_status != 'idle':
+                # 原子地占用机械臂，避免并发请求同时下发动作
+                if not self.robot_arm.try_reserve():
                     return jsonify({
-                        'error': f'机械臂正在执行操作，当前状态: {current_status}',
-                        'current_status': current_status,
+                        'error': '机械臂正在执行其他请求',
+                        'current_status': 'busy',
                         'message': '请等待当前操作完成后再试'
                     }), 409
                 
-                self.logger.info(f"🧪 测试分拣垃圾类型: {garbage_type}")
-                
-                success = self.robot_arm.sort_garbage(garbage_type)
-                if success:
-                    stats = self.robot_arm.get_statistics()
-                    return jsonify({
-                        'success': True,
-                        'message': f'测试分拣 {garbage_type} 成功',
-                        'statistics': stats
-                    })
-                else:
-                    return jsonify({'error': f'分拣 {garbage_type} 失败'}), 500
+                try:
+                    # 检查机械臂状态，确保不在执行其他操作
+                    status = self.robot_arm.get_status()
+                    current_status = status.get('status', 'unknown')
                     
+                    if current_status != 'idle':
+                        return jsonify({
+                            'error': f'机械臂正在执行操作，当前状态: {current_status}',
+                            'current_status': current_status,
+                            'message': '请等待当前操作完成后再试'
+                        }), 409
+                    
+                    self.logger.info(f"🧪 测试分拣垃圾类型: {garbage_type}")
+                    
+                    success = self.robot_arm.sort_garbage(garbage_type)
+                    if success:
+                        stats = self.robot_arm.get_statistics()
+                        return jsonify({
+                            'success': True,
+                            'message': f'测试分拣 {garbage_type} 成功',
+                            'statistics': stats
+                        })
+                    else:
+                        return jsonify({'error': f'分拣 {garbage_type} 失败'}), 500
+                finally:
+                    self.robot_arm.release_reservation()
+                
             except Exception as e:
                 self.logger.error(f"测试分拣失败: {e}")
                 return jsonify({'error': str(e)}), 500
@@ -657,28 +869,7 @@ class WebApp:
         def api_robot_arm_types():
             """获取支持的机械臂类型列表"""
             try:
-                from ..hardware.robot_arm import get_supported_arm_types, get_arm_type_info
-                
-                arm_types = get_supported_arm_types()
-                types_info = []
-                
-                for arm_type in arm_types:
-                    info = get_arm_type_info(arm_type)
-                    types_info.append({
-                        'type': arm_type,
-                        'name': info['name'],
-                        'description': info['description'],
-                        'features': info['features'],
-                        'config_required': info['config_required'],
-                        'config_fields': info.get('config_fields', []),
-                        'available': self._check_arm_type_availability(arm_type)
-                    })
-                
-                return jsonify({
-                    'success': True,
-                    'types': types_info,
-                    'current_type': self.robot_arm.arm_type if self.robot_arm else None
-                })
+                return Response(self._types_response_body, mimetype='application/json')
                 
             except Exception as e:
                 self.logger.error(f"获取机械臂类型失败: {e}")
@@ -749,11 +940,13 @@ class WebApp:
                     if new_robot_arm.connect():
                         # 成功连接，替换当前机械臂
                         self.robot_arm = new_robot_arm
+                        self._stats_cache = None
                         
                         # 尝试归位
                         if hasattr(self.robot_arm, 'home'):
                             self.robot_arm.home()
                         
+                        self._refresh_types_response()
                         self.logger.info(f"✅ 机械臂切换成功: {new_arm_type}")
                         
                         return jsonify({
@@ -829,47 +1022,368 @@ class WebApp:
             return Response(self.generate_frames(),
                           mimetype='multipart/x-mixed-replace; boundary=frame')
     
+    def _acquire_upload_buffer(self) -> bytearray:
+        """
+        从共享池借出一个上传缓冲区，容量按本次请求体大小确定，用完后需放回 _upload_pool
+        
+        Returns:
+            不小于请求体的缓冲区（池中缓冲区过小时分配新的替换它）
+        """
+        limit = self.app.config['MAX_CONTENT_LENGTH']
+        size = min(request.content_length or limit, limit)
+        try:
+            buf = self._upload_pool.get_nowait()
+        except queue.Empty:
+            buf = None
+        if buf is None or len(buf) < size:
+            buf = bytearray(size)
+        return buf
+    
+    def _read_upload(self, file, buf: bytearray) -> memoryview:
+        """
+        将上传文件读入借出的缓冲区
+        
+        Args:
+            file: 上传的文件对象 (FileStorage)
+            buf: _acquire_upload_buffer 借出的缓冲区
+        
+        Returns:
+            指向已读取内容的memoryview，仅在缓冲区归还前有效
+        """
+        view = memoryview(buf)
+        
+        stream = file.stream
+        readinto = getattr(stream, 'readinto', None)
+        if readinto is None:
+            # 旧版Python的SpooledTemporaryFile不支持readinto
+            data = stream.read(len(buf))
+            view[:len(data)] = data
+            return view[:len(data)]
+        
+        size = 0
+        while size < len(buf):
+            n = readinto(view[size:])
+            if not n:
+                break
+            size += n
+        return view[:size]
+    
+    def _detection_response(self, jpeg_bytes: bytes, metadata: dict,
+                            include_image: bool = True) -> Response:
+        """
+        构建图像检测响应
+        
+        默认为JPEG二进制响应体 + X-Detections 元数据响应头；不需要图像时，
+        或元数据超过 DETECTIONS_HEADER_LIMIT 时，改为JSON响应体，图像以base64放在 image 字段
+        （jpeg_bytes 仅在 include_image 为False时可为None）
+        """
+        if not include_image:
+            return jsonify(metadata)
+        
+        # 响应头只能包含ASCII字符，json.dumps默认转义非ASCII字符
+        header = json.dumps(metadata)
+        if len(header) > DETECTIONS_HEADER_LIMIT:
+            body = dict(metadata)
+            body['image'] = 'data:image/jpeg;base64,' + base64.b64encode(jpeg_bytes).decode('ascii')
+            return jsonify(body)
+        
+        response = Response(jpeg_bytes, mimetype='image/jpeg')
+        response.headers['X-Detections'] = header
+        return response
+    
+    @staticmethod
+    def _content_hash(data: bytes) -> int:
+        """计算上传内容或图像缓冲区的快速哈希"""
+        if xxhash is not None:
+            return xxhash.xxh3_64_intdigest(data)
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+    
+    def _get_cached_detection(self, key: int):
+        """获取缓存的检测结果 (jpeg_bytes, metadata)，未命中返回None"""
+        with self._detect_cache_lock:
+            cached = self._detect_cache.get(key)
+            if cached is not None:
+                self._detect_cache.move_to_end(key)
+            return cached
+    
+    def _put_cached_detection(self, key: int, value):
+        """写入检测结果缓存，超出容量时淘汰最久未使用的条目"""
+        with self._detect_cache_lock:
+            self._detect_cache[key] = value
+            self._detect_cache.move_to_end(key)
+            while len(self._detect_cache) > self._detect_cache_size:
+                self._detect_cache.popitem(last=False)
+    
+    def _clear_detect_cache(self):
+        """清空检测结果缓存（更换模型后旧结果失效）"""
+        with self._detect_cache_lock:
+            self._detect_cache.clear()
+    
+    def _refresh_types_response(self):
+        """重新构建机械臂类型列表并预先序列化 /api/robot_arm/types 的响应体"""
+        self._types_info = self._build_types_info()
+        self._types_response_body = self.app.json.dumps({
+            'success': True,
+            'types': self._types_info,
+            'current_type': self.robot_arm.arm_type if self.robot_arm else None
+        }).encode('utf-8')
+    
+    def _build_types_info(self) -> list:
+        """构建支持的机械臂类型列表（含可用性）"""
+        from ..hardware.robot_arm import get_supported_arm_types, get_arm_type_info
+        
+        types_info = []
+        for arm_type in get_supported_arm_types():
+            info = get_arm_type_info(arm_type)
+            types_info.append({
+                'type': arm_type,
+                'name': info['name'],
+                'description': info['description'],
+                'features': info['features'],
+                'config_required': info['config_required'],
+                'config_fields': info.get('config_fields', []),
+                'available': self._check_arm_type_availability(arm_type)
+            })
+        return types_info
+    
     def _check_arm_type_availability(self, arm_type: str) -> bool:
         """检查机械臂类型的可用性"""
-        try:
-            from ..hardware.robot_arm_interface import create_robot_arm
-            # 尝试创建实例来检查可用性
-            test_instance = create_robot_arm(arm_type, {'test_mode': True})
-            return test_instance is not None
-        except Exception:
-            return False
+        return _arm_available(arm_type)
 
-    def generate_frames(self):
-        """生成视频帧"""
-        while True:
+    def _start_encode_loop(self):
+        """启动视频流生产者线程（已在运行且未被通知停止时不重复启动）"""
+        with self._encode_lock:
+            if (self._encode_thread is not None and self._encode_thread.is_alive()
+                    and not self._encode_stop.is_set()):
+                return
+            # 正在退出的旧线程先等待结束，保证同一时刻只有一个生产者
+            self._join_encode_thread()
+            self._encode_stop = threading.Event()
+            self._encode_thread = threading.Thread(
+                target=self._encode_loop, args=(self._encode_stop,), daemon=True)
+            self._encode_thread.start()
+    
+    def _stop_encode_loop(self):
+        """通知视频流生产者线程停止并等待其退出"""
+        with self._encode_lock:
+            if self._encode_stop is not None:
+                self._encode_stop.set()
+            self._join_encode_thread()
+    
+    def _join_encode_thread(self):
+        """等待生产者线程退出（调用方需持有 _encode_lock）"""
+        if self._encode_thread is not None:
+            self._encode_stop.set()
+            self._encode_thread.join(timeout=5.0)
+            if self._encode_thread.is_alive():
+                self.logger.warning("视频流生产者线程未能在5秒内退出")
+            self._encode_thread = None
+    
+    def _encode_loop(self, stop_event: threading.Event):
+        """
+        视频流生产者线程
+        
+        读取摄像头共享内存环形缓冲区中的新帧，在合并窗口内凑批后统一检测，
+        编码结果封装为完整的multipart分段写入 _latest_part 并通知所有 /video_feed 客户端；
+        stop_event 被设置（实时检测停止或重新启动）后退出
+        """
+        last_generation = 0
+        # 上一帧检测结果的哈希及其编码好的分段，画面未变化时跳过JPEG编码
+        last_hash = None
+        last_part = None
+        pending = []
+        first_pending_time = 0.0
+        while not stop_event.is_set():
             try:
-                if not self.detection_active or self.camera is None or self.detector is None:
+                camera = self.camera
+                detector = self.detector
+                if camera is None or detector is None:
                     time.sleep(0.1)
                     continue
                 
-                # 获取摄像头帧
-                frame = self.camera.get_frame()
-                if frame is None:
-                    time.sleep(0.1)
+                # 收集新帧（复制出环形缓冲区，避免凑批期间被覆盖）
+                generation, frame = camera.get_latest_frame()
+                if frame is not None and generation != last_generation:
+                    last_generation = generation
+                    if not pending:
+                        first_pending_time = time.time()
+                    pending.append(frame.copy())
+                
+                if not pending:
+                    time.sleep(0.005)
                     continue
                 
-                # 执行检测并绘制结果
-                result_frame, _ = self.detector.detect_and_draw(frame)
+                # 凑够一批或超过合并窗口后统一推理
+                if (len(pending) < self.stream_batch_size
+                        and time.time() - first_pending_time < self.stream_batch_window):
+                    time.sleep(0.002)
+                    continue
                 
-                # 编码为JPEG
-                _, buffer = cv2.imencode('.jpg', result_frame)
-                frame_bytes = buffer.tobytes()
+                frames, pending = pending, []
+                if len(frames) > 1:
+                    outputs = detector.detect_batch(frames)
+                else:
+                    outputs = [detector.detect_and_draw(frames[0])]
                 
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                for result_frame, _ in outputs:
+                    frame_hash = self._content_hash(np.ascontiguousarray(result_frame).data)
+                    if frame_hash == last_hash and last_part is not None:
+                        part = last_part
+                    else:
+                        # 编码为JPEG
+                        frame_bytes = ImageProcessor.encode_jpeg(
+                            result_frame, quality=self.stream_jpeg_quality, chroma_420=True)
+                        
+                        # 分段只拼接一次，所有客户端直接复用同一个bytes对象
+                        part = b''.join((_FRAME_HEADER, b'%d\r\n\r\n' % len(frame_bytes),
+                                         frame_bytes, _FRAME_TAIL))
+                        last_hash, last_part = frame_hash, part
+                    
+                    with self._frame_cv:
+                        self._latest_part = part
+                        self._latest_seq += 1
+                        self._frame_cv.notify_all()
+                    self._notify_async_clients()
                 
             except Exception as e:
+                pending = []
                 self.logger.error(f"视频流生成失败: {e}")
                 time.sleep(1)
     
+    def generate_frames(self):
+        """
+        生成视频帧
+        
+        所有客户端共享生产者线程编码好的最新帧，每个客户端按 stream_fps 限制输出帧率；
+        实时检测停止后结束流，释放客户端占用的工作线程
+        """
+        last_seq = 0
+        min_interval = 1.0 / max(self.stream_fps, 1)
+        while True:
+            with self._frame_cv:
+                self._frame_cv.wait_for(lambda: self._latest_seq != last_seq, timeout=1.0)
+                part = self._latest_part
+                seq = self._latest_seq
+            
+            if seq == last_seq and not self.detection_active:
+                break
+            if part is None or seq == last_seq:
+                continue
+            last_seq = seq
+            
+            started = time.time()
+            yield part
+            
+            wait = min_interval - (time.time() - started)
+            if wait > 0:
+                time.sleep(wait)
+    
+    def _notify_async_clients(self):
+        """从生产者线程唤醒事件循环中等待新帧的ASGI视频流客户端"""
+        loop = self._frame_loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake_async_clients)
+        except RuntimeError:
+            # 事件循环已关闭
+            self._frame_loop = None
+    
+    def _wake_async_clients(self):
+        """触发当前新帧事件并换上新的事件对象（在事件循环线程中执行）"""
+        event, self._frame_event = self._frame_event, asyncio.Event()
+        event.set()
+    
+    async def video_feed_asgi(self, scope, receive, send):
+        """
+        ASGI视频流
+        
+        每个客户端只是一个协程，等待生产者线程通过 asyncio.Event 通知新帧，
+        不再为每个客户端占用一个工作线程
+        """
+        self._frame_loop = asyncio.get_running_loop()
+        
+        disconnected = asyncio.Event()
+        
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+        
+        watcher = asyncio.ensure_future(watch_disconnect())
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'multipart/x-mixed-replace; boundary=frame'),
+                (b'cache-control', b'no-cache'),
+                (b'access-control-allow-origin', b'*'),
+            ],
+        })
+        
+        last_seq = 0
+        min_interval = 1.0 / max(self.stream_fps, 1)
+        try:
+            while not disconnected.is_set():
+                # 先取事件再读帧，生产者在两者之间发布的新帧不会丢失通知
+                event = self._frame_event
+                with self._frame_cv:
+                    part = self._latest_part
+                    seq = self._latest_seq
+                
+                if part is None or seq == last_seq:
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                last_seq = seq
+                
+                started = time.time()
+                await send({
+                    'type': 'http.response.body',
+                    'body': part,
+                    'more_body': True,
+                })
+                
+                wait = min_interval - (time.time() - started)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+        finally:
+            watcher.cancel()
+    
     def get_app(self):
         """获取Flask应用实例"""
         return self.app
+    
+    def get_asgi_app(self):
+        """
+        获取ASGI应用：/video_feed 由原生协程处理，其余请求转交Flask
+        
+        Returns:
+            ASGI应用，可由 hypercorn 等ASGI服务器运行
+        """
+        if AsyncioWSGIMiddleware is None:
+            raise RuntimeError("ASGI模式需要安装 hypercorn: pip install hypercorn")
+        
+        # 请求体上限与Flask一致，否则中间件默认的64KB上限会拒绝图像上传
+        flask_asgi = AsyncioWSGIMiddleware(self.app, max_body_size=self.app.config['MAX_CONTENT_LENGTH'])
+        
+        async def asgi_app(scope, receive, send):
+            if scope['type'] == 'http' and scope['path'] == '/video_feed':
+                await self.video_feed_asgi(scope, receive, send)
+            elif scope['type'] == 'lifespan':
+                while True:
+                    message = await receive()
+                    if message['type'] == 'lifespan.startup':
+                        await send({'type': 'lifespan.startup.complete'})
+                    elif message['type'] == 'lifespan.shutdown':
+                        await send({'type': 'lifespan.shutdown.complete'})
+                        return
+            else:
+                await flask_asgi(scope, receive, send)
+        
+        return asgi_app
 
 
 def create_app():
@@ -878,6 +1392,12 @@ def create_app():
     return web_app.get_app()
 
 
+
+def create_asgi_app():
+    """创建ASGI应用（视频流使用协程，适合多客户端同时观看）"""
+    web_app = WebApp()
+    return web_app.get_asgi_app()
+
 # 用于直接运行
 if __name__ == '__main__':
     app = create_app()
@@ -11,10 +11,12 @@ import time
 import signal
 import subprocess
 import threading
-import urllib.request
-import urllib.error
+import re
+import json
+import hashlib
 from pathlib import Path
 import importlib.util
+import importlib.metadata
 
 # 服务配置
 BACKEND_SCRIPT = "scripts/run_system.py"
@@ -27,6 +29,8 @@ MODEL_DIR = "models"
 MODEL_FILE = "best.pt"
 MODEL_PATH = Path(MODEL_DIR) / MODEL_FILE
 EXPECTED_SIZE = 6 * 1024 * 1024  # 6MB
+MODEL_SHA256 = None  # 模型文件SHA-256校验值，为None时只打印不校验
+DOWNLOAD_CHUNK_SIZE = 1 << 20  # 1MiB
 
 # 全局进程变量
 backend_process = None
@@ -47,12 +51,32 @@ def create_model_directory():
     model_dir.mkdir(exist_ok=True)
     print(f"📁 模型目录已创建: {model_dir.absolute()}")
 
-def download_progress_hook(block_num, block_size, total_size):
-    """下载进度回调函数"""
-    if total_size > 0:
-        percent = min(100, (block_num * block_size * 100) // total_size)
-        downloaded = min(block_num * block_size, total_size)
-        print(f"\r📥 下载进度: {percent:3d}% ({downloaded:,} / {total_size:,} bytes)", end='', flush=True)
+def normalize_package_name(name):
+    """规范化包名（PEP 503），用于比较requirements与已安装的发行包"""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+def get_missing_requirements(requirements_file='requirements.txt'):
+    """
+    对比requirements.txt与已安装的发行包，返回缺失的依赖项
+    
+    Returns:
+        list: 缺失的requirements行（保留版本约束和extras）
+    """
+    installed = {
+        normalize_package_name(dist.metadata['Name'])
+        for dist in importlib.metadata.distributions()
+        if dist.metadata['Name']
+    }
+    
+    missing = []
+    for line in Path(requirements_file).read_text(encoding='utf-8').splitlines():
+        requirement = line.split('#', 1)[0].strip()
+        if not requirement or requirement.startswith('-'):
+            continue
+        name = re.split(r'[\s\[<>=!~;]', requirement, 1)[0]
+        if normalize_package_name(name) not in installed:
+            missing.append(requirement)
+    return missing
 
 def check_python_dependencies():
     """检查Python依赖是否已安装"""
@@ -61,6 +85,7 @@ def check_python_dependencies():
     # 检查关键依赖
     required_packages = [
         ('flask', 'Flask'),
+        ('httpx', 'httpx'),
         ('ultralytics', 'ultralytics'),
         ('cv2', 'opencv-python'),
         ('torch', 'torch'),
@@ -70,18 +95,22 @@ def check_python_dependencies():
     
     missing_packages = []
     for import_name, package_name in required_packages:
-        try:
-            __import__(import_name)
-        except ImportError:
+        # 只查找模块规格，不实际导入（避免加载torch/cv2等大型扩展）
+        if importlib.util.find_spec(import_name) is None:
             missing_packages.append(package_name)
     
     if missing_packages:
         print(f"❌ 缺少以下Python包: {', '.join(missing_packages)}")
-        print("📦 正在安装Python依赖...")
         
         try:
+            # 只安装requirements.txt中确实缺失的包，避免pip重新解析全部依赖
+            missing_requirements = get_missing_requirements()
+            if not missing_requirements:
+                missing_requirements = missing_packages
+            print(f"📦 正在安装Python依赖: {' '.join(missing_requirements)}")
+            
             result = subprocess.run([
-                sys.executable, '-m', 'pip', 'install', '-r', 'requirements.txt'
+                sys.executable, '-m', 'pip', 'install', *missing_requirements
             ], capture_output=True, text=True)
             
             if result.returncode == 0:
@@ -104,8 +133,18 @@ def check_node_dependencies():
     web_dir = Path("web")
     node_modules = web_dir / "node_modules"
     
-    if not node_modules.exists():
-        print("❌ Node.js依赖未安装")
+    # 对比package.json与node_modules，找出未安装的包；
+    # package.json 缺失或无法解析时退回只检查 node_modules 目录是否存在
+    try:
+        package_json = json.loads((web_dir / "package.json").read_text(encoding='utf-8'))
+        declared = {**package_json.get('dependencies', {}), **package_json.get('devDependencies', {})}
+        missing = [name for name in declared if not (node_modules / name / "package.json").exists()]
+    except (OSError, ValueError) as e:
+        print(f"⚠️  无法读取 web/package.json: {e}")
+        missing = [] if node_modules.exists() else ['node_modules']
+    
+    if missing:
+        print(f"❌ Node.js依赖未安装: {', '.join(missing)}")
         print("📦 正在安装Node.js依赖...")
         
         try:
@@ -127,39 +166,120 @@ def check_node_dependencies():
         return True
 
 def download_model():
-    """下载预训练模型"""
-    model_path = Path("models/best.pt")
+    """下载预训练模型（支持断点续传）"""
+    model_path = MODEL_PATH
     
     if model_path.exists():
         print("✅ 模型文件已存在")
         return True
     
+    # 依赖检查通过后才导入
+    import httpx
+    from tqdm import tqdm
+    
+    model_path.parent.mkdir(exist_ok=True)
+    part_path = model_path.with_name(model_path.name + '.part')
+    
     print("📥 正在下载预训练模型...")
-    try:
-        result = subprocess.run([sys.executable, "setup.py"], capture_output=True, text=True)
-        if result.returncode == 0:
-            print("✅ 模型下载成功")
-            return True
-        else:
-            print(f"❌ 模型下载失败: {result.stderr}")
+    # 续传起点无效（416）时删除残留文件后重新下载一次
+    for _ in range(2):
+        start = part_path.stat().st_size if part_path.exists() else 0
+        headers = {'Range': f'bytes={start}-'} if start else {}
+        hash_ctx = hashlib.sha256()
+        expected_total = 0
+        restart = False
+        try:
+            with httpx.stream('GET', MODEL_URL, headers=headers, follow_redirects=True, timeout=30) as response:
+                if response.status_code == 416:
+                    # 续传起点超出文件长度，说明残留文件无效
+                    restart = True
+                else:
+                    response.raise_for_status()
+                    
+                    if response.status_code != 206:
+                        # 服务器不支持断点续传，从头下载
+                        start = 0
+                    elif start:
+                        # 已下载部分先计入校验值
+                        with open(part_path, 'rb') as f:
+                            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+                                hash_ctx.update(chunk)
+                        print(f"🔄 从 {start:,} bytes 处继续下载")
+                    
+                    # 完整文件长度：优先取 Content-Range 中的总长度，否则为起点加本次内容长度
+                    content_range = response.headers.get('content-range', '')
+                    total_text = content_range.rpartition('/')[2]
+                    if response.status_code == 206 and total_text.isdigit():
+                        expected_total = int(total_text)
+                    elif 'content-length' in response.headers:
+                        expected_total = start + int(response.headers['content-length'])
+                    
+                    with open(part_path, 'ab' if start else 'wb') as f, \
+                            tqdm(total=expected_total or None, initial=start, unit='B', unit_scale=True,
+                                 desc='📥 下载进度') as progress:
+                        for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            hash_ctx.update(chunk)
+                            progress.update(len(chunk))
+        except httpx.HTTPError as e:
+            print(f"❌ 下载模型时出错: {e}")
+            print("💡 已下载的部分会保留，重新运行即可断点续传")
             return False
-    except Exception as e:
-        print(f"❌ 下载模型时出错: {e}")
+        except Exception as e:
+            print(f"❌ 下载模型时出错: {e}")
+            return False
+        
+        if not restart:
+            break
+        part_path.unlink()
+    else:
+        print("❌ 下载模型失败: 服务器拒绝了续传请求")
         return False
+    
+    digest = hash_ctx.hexdigest()
+    if MODEL_SHA256 and digest != MODEL_SHA256:
+        print(f"❌ 模型校验失败: SHA-256 {digest} 与预期不符")
+        part_path.unlink()
+        return False
+    
+    # 大小与服务器声明的完整长度不符（或未声明长度且明显过小）时删除残留文件，避免下次在错误数据上续传
+    file_size = part_path.stat().st_size
+    if (expected_total and file_size != expected_total) or \
+            (not expected_total and file_size < EXPECTED_SIZE * 0.5):
+        print(f"❌ 文件大小异常 ({file_size:,} bytes)，下载不完整，请重新运行")
+        part_path.unlink()
+        return False
+    
+    os.replace(part_path, model_path)
+    print(f"✅ 模型下载成功 (SHA-256: {digest})")
+    return True
 
 def stream_output(process, prefix):
-    """实时输出进程日志"""
+    """实时输出进程日志（按块读取原始字节，批量切分行）"""
+    fd = process.stdout.fileno()
+    tag = f"[{prefix}] ".encode('utf-8')
+    out = sys.stdout.buffer
+    pending = b''
     while not shutdown_event.is_set():
         try:
-            line = process.stdout.readline()
-            if line:
-                print(f"[{prefix}] {line.strip()}")
-            elif process.poll() is not None:
+            chunk = os.read(fd, 65536)
+            if not chunk:
                 break
+            pending += chunk
+            *lines, pending = pending.split(b'\n')
+            if lines:
+                # 先刷新print的文本缓冲，保证输出顺序
+                sys.stdout.flush()
+                out.write(b''.join(tag + line.rstrip(b'\r') + b'\n' for line in lines))
+                out.flush()
         except Exception as e:
             if not shutdown_event.is_set():
                 print(f"[{prefix}] 日志读取错误: {e}")
             break
+    if pending:
+        sys.stdout.flush()
+        out.write(tag + pending.rstrip(b'\r') + b'\n')
+        out.flush()
 
 def start_backend():
     """启动后端服务"""
@@ -171,8 +291,7 @@ def start_backend():
             [sys.executable, "scripts/run_system.py"],
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
+            bufsize=0
         )
         
         # 启动日志监控线程
@@ -199,8 +318,7 @@ def start_frontend():
             cwd="web",
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
+            bufsize=0
         )
         
         # 启动日志监控线程
@@ -7,13 +7,26 @@
 
 import streamlit as st
 import os
+import json
+import hashlib
+import sqlite3
+import threading
+import time
 from pathlib import Path
 import random
 from PIL import Image
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from collections import Counter
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# numba 为可选依赖，不可用时统计函数以普通 NumPy 代码运行
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 # 页面配置
 st.set_page_config(
@@ -36,6 +49,91 @@ CATEGORY_MAPPING = {
     "cardboard_box": "纸箱"
 }
 
+# 类别中文名查询（绑定方法，调用前先判断类别是否在映射中）
+_ZH = CATEGORY_MAPPING.__getitem__
+
+# 支持的图片格式（小写扩展名，含点）
+_EXT = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'})
+
+def scan_image_entries(directory):
+    """
+    使用 os.scandir 列出目录中的图片文件（DirEntry 自带文件类型信息，无需逐个 stat）
+    """
+    with os.scandir(directory) as it:
+        return [e for e in it
+                if e.is_file(follow_symlinks=False) and e.name[e.name.rfind('.'):].lower() in _EXT]
+
+class ProbeCache:
+    """
+    图片探测结果的持久化缓存（SQLite）
+    
+    图片以 (路径, mtime, 文件大小) 判断是否失效；类别目录以目录 mtime 判断图片列表是否变化，
+    服务重启后无需重新扫描和解析未变化的文件
+    """
+    
+    def __init__(self, db_path='.probe_cache.db'):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS probes ('
+                'path TEXT PRIMARY KEY, dir TEXT, mtime REAL, size INT, w INT, h INT, fmt TEXT)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS probes_dir ON probes (dir)')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS dirs ('
+                'path TEXT PRIMARY KEY, mtime REAL, count INT, files TEXT)'
+            )
+    
+    def get_probes(self, directory):
+        """获取目录下所有已缓存的探测结果 {路径: (mtime, size, w, h, fmt)}"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT path, mtime, size, w, h, fmt FROM probes WHERE dir = ?', (str(directory),)
+            ).fetchall()
+        return {row[0]: row[1:] for row in rows}
+    
+    def put_probes(self, directory, rows):
+        """批量写入探测结果，rows 为 [(path, mtime, size, w, h, fmt), ...]"""
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO probes (path, dir, mtime, size, w, h, fmt) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(path, str(directory)) + tuple(rest) for path, *rest in rows]
+            )
+    
+    def get_probe(self, path):
+        """获取单张图片的缓存探测结果 (mtime, size, w, h, fmt)，未缓存时返回None"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT mtime, size, w, h, fmt FROM probes WHERE path = ?', (str(path),)
+            ).fetchone()
+    
+    def get_dir(self, directory, mtime):
+        """获取目录的图片数量和文件列表，目录 mtime 变化时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT mtime, count, files FROM dirs WHERE path = ?', (str(directory),)
+            ).fetchone()
+        if row is None or row[0] != mtime:
+            return None
+        return row[1], json.loads(row[2])
+    
+    def put_dir(self, directory, mtime, count, files):
+        """写入目录的图片数量和文件列表"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO dirs (path, mtime, count, files) VALUES (?, ?, ?, ?)',
+                (str(directory), mtime, count, json.dumps(files))
+            )
+
+@st.cache_resource
+def get_probe_cache():
+    """获取全局的图片探测缓存"""
+    return ProbeCache()
+
 @st.cache_data
 def load_dataset_info(dataset_path="dataset-with-label"):
     """
@@ -49,24 +147,31 @@ def load_dataset_info(dataset_path="dataset-with-label"):
     categories_data = {}
     total_images = 0
     
-    # 支持的图片格式
-    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp', 
-                       '.JPG', '.JPEG', '.PNG', '.GIF', '.BMP', '.TIFF', '.WEBP'}
+    with os.scandir(dataset_path) as it:
+        category_dirs = [e for e in it if e.is_dir() and not e.name.startswith('.')]
     
-    for category_dir in dataset_path.iterdir():
-        if category_dir.is_dir() and not category_dir.name.startswith('.'):
+    probe_cache = get_probe_cache()
+    
+    for category_dir in category_dirs:
+        # 目录未变化时直接使用缓存的统计结果
+        dir_mtime = category_dir.stat().st_mtime
+        cached = probe_cache.get_dir(category_dir.path, dir_mtime)
+        if cached is not None:
+            count, files = cached
+        else:
             # 统计图片数量
-            image_files = [f for f in category_dir.iterdir() 
-                          if f.is_file() and f.suffix in image_extensions]
-            
-            count = len(image_files)
-            total_images += count
-            
-            categories_data[category_dir.name] = {
-                'count': count,
-                'chinese_name': CATEGORY_MAPPING.get(category_dir.name, category_dir.name),
-                'files': image_files[:100]  # 最多缓存100个文件路径
-            }
+            image_entries = scan_image_entries(category_dir.path)
+            count = len(image_entries)
+            files = [e.path for e in image_entries[:100]]  # 最多缓存100个文件路径
+            probe_cache.put_dir(category_dir.path, dir_mtime, count, files)
+        
+        total_images += count
+        
+        categories_data[category_dir.name] = {
+            'count': count,
+            'chinese_name': _ZH(category_dir.name) if category_dir.name in CATEGORY_MAPPING else category_dir.name,
+            'files': [Path(f) for f in files]
+        }
     
     return categories_data, total_images
 
@@ -80,12 +185,7 @@ def get_sample_images(category_path, num_samples=9):
     if not category_path.exists():
         return []
     
-    # 支持的图片格式
-    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp', 
-                       '.JPG', '.JPEG', '.PNG', '.GIF', '.BMP', '.TIFF', '.WEBP'}
-    
-    image_files = [f for f in category_path.iterdir() 
-                  if f.is_file() and f.suffix in image_extensions]
+    image_files = [Path(e.path) for e in scan_image_entries(category_path)]
     
     # 随机选择样本
     if len(image_files) > num_samples:
@@ -95,6 +195,99 @@ def get_sample_images(category_path, num_samples=9):
     
     return sample_files
 
+# 缩略图磁盘缓存目录
+THUMB_CACHE_DIR = Path('.thumb_cache')
+THUMB_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 缩略图缓存总大小上限，超出时按最近使用时间淘汰
+THUMB_PRUNE_INTERVAL = 600                 # 两次检查缓存大小的最短间隔（秒）
+
+def _thumb_path(image_file):
+    """
+    计算图片缩略图的缓存路径（路径 + 纳秒级 mtime 的哈希，文件修改后自动失效）
+    """
+    key = str(image_file).encode() + str(image_file.stat().st_mtime_ns).encode()
+    return THUMB_CACHE_DIR / f"{hashlib.blake2s(key, digest_size=16).hexdigest()}.jpg"
+
+def get_thumb(image_file):
+    """
+    获取图片的JPEG缩略图字节，命中磁盘缓存时直接读取，否则生成并写入缓存
+    """
+    cache_path = _thumb_path(image_file)
+    try:
+        data = cache_path.read_bytes()
+        # 更新 mtime 作为最近使用时间，供缓存淘汰使用
+        os.utime(cache_path)
+        return data
+    except FileNotFoundError:
+        pass
+    
+    with Image.open(image_file) as image:
+        # JPEG使用draft模式在解码时直接按1/2~1/8缩小，避免全分辨率解码
+        image.draft('RGB', (600, 600))
+        
+        # 调整大小以适应显示
+        image.thumbnail((300, 300), Image.BILINEAR)
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            # 透明区域合成到白色背景上，直接转RGB会变成黑色或杂色
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        THUMB_CACHE_DIR.mkdir(exist_ok=True)
+        tmp_path = cache_path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        image.save(tmp_path, 'JPEG', quality=75)
+    
+    # 原子替换，避免多个会话同时读到写了一半的文件
+    os.replace(tmp_path, cache_path)
+    
+    # Streamlit 每次交互都会重新执行脚本，检查间隔记录在缓存目录的标记文件上
+    marker = THUMB_CACHE_DIR / '.last_prune'
+    try:
+        due = time.time() - marker.stat().st_mtime > THUMB_PRUNE_INTERVAL
+    except FileNotFoundError:
+        due = True
+    if due:
+        marker.touch()
+        _prune_thumb_cache()
+    return cache_path.read_bytes()
+
+def _prune_thumb_cache():
+    """
+    缩略图缓存超过总大小上限时，按最近使用时间从旧到新删除，直到降到上限的80%
+    （源文件修改或删除后遗留的旧缩略图不再被访问，会最先被淘汰）
+    """
+    try:
+        with os.scandir(THUMB_CACHE_DIR) as it:
+            entries = [(st.st_mtime, st.st_size, e.path)
+                       for e in it if e.name.endswith('.jpg') for st in (e.stat(),)]
+    except FileNotFoundError:
+        return
+    
+    total = sum(size for _, size, _ in entries)
+    if total <= THUMB_CACHE_MAX_BYTES:
+        return
+    target = THUMB_CACHE_MAX_BYTES * 0.8
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        if total <= target:
+            break
+
+def _original_size(image_file):
+    """
+    获取图片原始尺寸，优先读取探测缓存，缓存缺失或过期时只解析文件头
+    """
+    cached = get_probe_cache().get_probe(image_file)
+    if cached is not None and cached[0] == image_file.stat().st_mtime:
+        return cached[2], cached[3]
+    with Image.open(image_file) as image:
+        return image.size
+
 def display_image_grid(image_files, cols=3, show_details=True):
     """
     以网格形式显示图片，包含详细标注信息
@@ -112,20 +305,15 @@ def display_image_grid(image_files, cols=3, show_details=True):
                 image_file = image_files[i + j]
                 try:
                     with col:
-                        image = Image.open(image_file)
-                        original_size = image.size
-                        
-                        # 调整大小以适应显示
-                        image.thumbnail((300, 300))
-                        
-                        # 显示图片
-                        st.image(image, use_container_width=True)
+                        # 显示图片（缩略图字节来自磁盘缓存）
+                        st.image(get_thumb(image_file), use_container_width=True)
                         
                         # 显示详细标注信息
                         if show_details:
                             st.markdown("**📝 图片标注信息**")
                             
                             # 基本信息
+                            original_size = _original_size(image_file)
                             file_info = {
                                 "文件名": image_file.name,
                                 "原始尺寸": f"{original_size[0]} × {original_size[1]}",
@@ -135,7 +323,8 @@ def display_image_grid(image_files, cols=3, show_details=True):
                             
                             # 从文件名推断的标注信息
                             category_from_path = image_file.parent.name
-                            chinese_name = CATEGORY_MAPPING.get(category_from_path, category_from_path)
+                            chinese_name = (_ZH(category_from_path) if category_from_path in CATEGORY_MAPPING
+                                            else category_from_path)
                             
                             # 显示标注
                             st.markdown(f"🏷️ **类别**: {chinese_name}")
@@ -148,7 +337,10 @@ def display_image_grid(image_files, cols=3, show_details=True):
                                 
                                 # 如果是JPG文件，尝试读取EXIF信息
                                 try:
-                                    if hasattr(image, '_getexif') and image._getexif():
+                                    # 只解析文件头读取EXIF，不解码像素
+                                    with Image.open(image_file) as image:
+                                        has_exif = hasattr(image, '_getexif') and image._getexif()
+                                    if has_exif:
                                         st.write("**EXIF信息**: 存在")
                                     else:
                                         st.write("**EXIF信息**: 无")
@@ -222,6 +414,39 @@ def create_pie_chart(categories_data):
     
     return fig
 
+# 图片统计使用的结构化数组类型：宽、高、文件大小、格式
+PROBE_DTYPE = np.dtype([('w', 'i4'), ('h', 'i4'), ('sz', 'i8'), ('fmt', 'U8')])
+
+# 图片头信息探测结果
+ImageProbe = namedtuple('ImageProbe', ['name', 'w', 'h', 'size', 'fmt', 'error'])
+
+def _probe(image_file):
+    """
+    读取单张图片的尺寸和格式（只解析文件头，不解码像素）
+    """
+    try:
+        with Image.open(image_file.path) as image:
+            width, height = image.size
+            format_type = image.format or image_file.name.rsplit('.', 1)[-1].upper()
+        # DirEntry 缓存 stat 结果
+        return ImageProbe(image_file.name, width, height, image_file.stat().st_size, format_type, None)
+    except Exception as e:
+        return ImageProbe(image_file.name, 0, 0, 0, None, str(e))
+
+# 分辨率组合键的宽度倍数（高度小于该值）
+RES_KEY_BASE = 100000
+
+def _aggregate(w, h, sz, fmt):
+    """
+    汇总格式直方图、分辨率组合键和总大小
+    """
+    fmt_hist = np.bincount(fmt, minlength=16)
+    res_key = w * RES_KEY_BASE + h
+    return fmt_hist, res_key, sz.sum()
+
+if njit is not None:
+    _aggregate = njit(cache=True)(_aggregate)
+
 def analyze_category_images(category_path):
     """
     分析类别中所有图片的详细信息
@@ -231,49 +456,87 @@ def analyze_category_images(category_path):
     if not category_path.exists():
         return None
     
-    # 支持的图片格式
-    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp', 
-                       '.JPG', '.JPEG', '.PNG', '.GIF', '.BMP', '.TIFF', '.WEBP'}
-    
-    image_files = [f for f in category_path.iterdir() 
-                  if f.is_file() and f.suffix in image_extensions]
+    image_files = scan_image_entries(category_path)
     
     if not image_files:
         return None
     
-    analysis_data = []
-    total_size = 0
-    formats = {}
-    resolutions = {}
+    # 先查持久化缓存，只探测新增或已修改（mtime/大小变化）的图片
+    probe_cache = get_probe_cache()
+    cached_probes = probe_cache.get_probes(category_path)
+    
+    probes = [None] * len(image_files)
+    pending = []
+    for i, image_file in enumerate(image_files):
+        stat = image_file.stat()
+        cached = cached_probes.get(image_file.path)
+        if cached is not None and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            _, size, width, height, format_type = cached
+            probes[i] = ImageProbe(image_file.name, width, height, size, format_type, None)
+        else:
+            pending.append(i)
     
-    for image_file in image_files:
-        try:
-            with Image.open(image_file) as image:
-                width, height = image.size
-                file_size = image_file.stat().st_size
-                format_type = image.format or image_file.suffix.upper().replace('.', '')
-                
-                analysis_data.append({
-                    'filename': image_file.name,
-                    'width': width,
-                    'height': height,
-                    'resolution': f"{width}×{height}",
-                    'file_size_kb': file_size / 1024,
-                    'format': format_type
-                })
-                
-                total_size += file_size
-                formats[format_type] = formats.get(format_type, 0) + 1
-                resolutions[f"{width}×{height}"] = resolutions.get(f"{width}×{height}", 0) + 1
-                
-        except Exception as e:
-            st.warning(f"无法分析图片 {image_file.name}: {str(e)}")
+    # 并行读取图片头信息（I/O为主，PIL解析文件头时会释放GIL）
+    if pending:
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            fresh = list(executor.map(_probe, [image_files[i] for i in pending]))
+        
+        new_rows = []
+        for i, probe in zip(pending, fresh):
+            probes[i] = probe
+            if probe.error is None:
+                stat = image_files[i].stat()
+                new_rows.append((image_files[i].path, stat.st_mtime, probe.size,
+                                 probe.w, probe.h, probe.fmt))
+        probe_cache.put_probes(category_path, new_rows)
+    
+    # Streamlit 组件只能在主线程调用
+    for probe in probes:
+        if probe.error is not None:
+            st.warning(f"无法分析图片 {probe.name}: {probe.error}")
+    results = [probe for probe in probes if probe.error is None]
+    
+    # 汇总到结构化数组，统计全部交给 NumPy/pandas 向量化完成
+    arr = np.empty(len(results), dtype=PROBE_DTYPE)
+    for i, r in enumerate(results):
+        arr[i] = (r.w, r.h, r.size, r.fmt)
+    
+    # 格式字符串映射为小整数编码后交给 _aggregate 统计
+    format_codes = {}
+    fmt = np.fromiter((format_codes.setdefault(r.fmt, len(format_codes)) for r in results),
+                      dtype=np.int64, count=len(results))
+    fmt_hist, res_key, total_size = _aggregate(
+        arr['w'].astype(np.int64), arr['h'].astype(np.int64), arr['sz'], fmt)
+    
+    # 按数量降序排列（与 value_counts 一致）
+    format_names = np.array(list(format_codes), dtype=object)
+    fmt_hist = fmt_hist[:len(format_names)]
+    order = np.argsort(-fmt_hist, kind='stable')
+    formats = pd.Series(fmt_hist[order], index=format_names[order])
+    
+    res_keys, res_counts = np.unique(res_key, return_counts=True)
+    order = np.argsort(-res_counts, kind='stable')
+    res_keys = res_keys[order]
+    resolutions = pd.Series(res_counts[order], index=[
+        f"{key // RES_KEY_BASE}×{key % RES_KEY_BASE}" for key in res_keys.tolist()])
+    
+    resolution = pd.Series(arr['w'].astype(str)) + '×' + pd.Series(arr['h'].astype(str))
+    analysis_data = pd.DataFrame({
+        'filename': [r.name for r in results],
+        'width': arr['w'],
+        'height': arr['h'],
+        'resolution': resolution,
+        'file_size_kb': arr['sz'] / 1024,
+        'format': arr['fmt']
+    })
+    
+    total_size = int(total_size)
     
     return {
         'images': analysis_data,
-        'total_count': len(analysis_data),
+        'total_count': len(arr),
         'total_size_mb': total_size / (1024 * 1024),
-        'avg_size_kb': (total_size / len(analysis_data)) / 1024 if analysis_data else 0,
+        'avg_size_kb': float(arr['sz'].mean()) / 1024 if len(arr) else 0,
         'formats': formats,
         'resolutions': resolutions
     }
@@ -439,24 +702,29 @@ def main():
             with col1:
                 # 格式分布
                 st.subheader("📋 格式分布")
-                format_df = pd.DataFrame([
-                    {'格式': format_type, '数量': count, '占比': f"{count/analysis['total_count']*100:.1f}%"}
-                    for format_type, count in analysis['formats'].items()
-                ])
+                format_counts = analysis['formats']
+                format_df = pd.DataFrame({
+                    '格式': format_counts.index,
+                    '数量': format_counts.values,
+                    '占比': np.char.mod('%.1f%%', format_counts.values / analysis['total_count'] * 100)
+                })
                 st.dataframe(format_df, use_container_width=True)
             
             with col2:
                 # 分辨率分布
                 st.subheader("📐 分辨率分布")
-                resolution_df = pd.DataFrame([
-                    {'分辨率': resolution, '数量': count, '占比': f"{count/analysis['total_count']*100:.1f}%"}
-                    for resolution, count in sorted(analysis['resolutions'].items(), key=lambda x: x[1], reverse=True)[:10]
-                ])
+                # value_counts 已按数量降序排列
+                resolution_counts = analysis['resolutions'].head(10)
+                resolution_df = pd.DataFrame({
+                    '分辨率': resolution_counts.index,
+                    '数量': resolution_counts.values,
+                    '占比': np.char.mod('%.1f%%', resolution_counts.values / analysis['total_count'] * 100)
+                })
                 st.dataframe(resolution_df, use_container_width=True)
             
             # 详细文件列表（可选展开）
             with st.expander("📂 查看完整文件列表"):
-                files_df = pd.DataFrame(analysis['images'])
+                files_df = analysis['images'].copy()
                 files_df = files_df.rename(columns={
                     'filename': '文件名',
                     'width': '宽度',
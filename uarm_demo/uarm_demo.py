@@ -7,9 +7,43 @@ import serial
 from serial.tools import list_ports
 import platform
 import math
+import atexit
+import queue
+import threading
+from collections import deque
+from functools import lru_cache
 import tensorrt as trt
 import pycuda.driver as cuda
-import pycuda.autoinit
+
+# torch/torchvision 为可选依赖，可用时原始输出引擎的阈值过滤和NMS在GPU上完成
+try:
+    import torch
+    import torchvision
+except ImportError:
+    torch = None
+
+# numba 为可选依赖，可用时CPU后处理的解码在一次遍历中完成
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# 使用设备主上下文而不是 pycuda.autoinit 新建的独立上下文：
+# TensorRT、PyTorch、OpenCV CUDA 等库共用同一个上下文，避免重复占用显存，
+# TensorRT的输出显存也可直接作为torch张量使用
+cuda.init()
+if torch is not None and torch.cuda.is_available():
+    torch.cuda.init()
+_cuda_context = cuda.Device(0).retain_primary_context()
+_cuda_context.push()
+
+
+def _release_cuda_context():
+    """退出时弹出并释放主上下文"""
+    _cuda_context.pop()
+    _cuda_context.detach()
+
+atexit.register(_release_cuda_context)
 
 # 类别定义
 CLASS_NAMES = [
@@ -17,9 +51,70 @@ CLASS_NAMES = [
     "instant_noodles", "milk_box_type1", "milk_box_type2", "plastic"
 ]
 
+def decode_outputs(output, conf, scale, pad_x, pad_y, img_w, img_h, out_boxes, out_scores, out_cls):
+    """
+    单次遍历原始输出：取最大类别分数、阈值过滤、xywh→xyxy、还原到原图坐标并裁剪
+    :param output: [4+类别数, 锚点数] 原始输出
+    :return: 写入 out_boxes/out_scores/out_cls 的检测框数量
+    """
+    num_classes = output.shape[0] - 4
+    count = 0
+    for i in range(output.shape[1]):
+        best_class = 0
+        best_score = output[4, i]
+        for c in range(1, num_classes):
+            if output[4 + c, i] > best_score:
+                best_score = output[4 + c, i]
+                best_class = c
+        if best_score <= conf:
+            continue
+        
+        half_w = output[2, i] / 2
+        half_h = output[3, i] / 2
+        out_boxes[count, 0] = min(max((output[0, i] - half_w - pad_x) / scale, 0.0), img_w)
+        out_boxes[count, 1] = min(max((output[1, i] - half_h - pad_y) / scale, 0.0), img_h)
+        out_boxes[count, 2] = min(max((output[0, i] + half_w - pad_x) / scale, 0.0), img_w)
+        out_boxes[count, 3] = min(max((output[1, i] + half_h - pad_y) / scale, 0.0), img_h)
+        out_scores[count] = best_score
+        out_cls[count] = best_class
+        count += 1
+    return count
+
+if njit is not None:
+    decode_outputs = njit(cache=True, fastmath=True)(decode_outputs)
+
+# TensorRT 8.5+ 的输出分配器：execute_async_v3 时输出写入预先分配的显存，
+# 只在数据相关形状的输出超出容量时才重新分配
+if hasattr(trt, 'IOutputAllocator'):
+    class OutputAllocator(trt.IOutputAllocator):
+        def __init__(self, buffer, ptr):
+            trt.IOutputAllocator.__init__(self)
+            self.buffer = buffer
+            self.ptr = ptr
+            self.nbytes = buffer['host'].nbytes
+            self.shape = None
+        
+        def reallocate_output(self, tensor_name, memory, size, alignment):
+            if size > self.nbytes:
+                self.buffer['device'] = cuda.mem_alloc(size)
+                self.ptr, self.nbytes = int(self.buffer['device']), size
+            return self.ptr
+        
+        def notify_shape(self, tensor_name, shape):
+            self.shape = tuple(shape)
+else:
+    OutputAllocator = None
+
 # TensorRT 推理引擎类
+# 支持两类引擎：
+#   1. 原始输出 [1, 4+类别数, 8400]，在主机端做阈值过滤和NMS
+#   2. 引擎内置NMS：追加 EfficientNMS_TRT 插件（num_dets/boxes/scores/classes 四个输出），
+#      或 ultralytics 以 `yolo export format=engine nms=True` 导出的 [1, N, 6] 输出，
+#      主机端只需处理不超过 max_output_boxes 个结果
+# 推荐以 FP16 导出引擎（`yolo export format=engine half=True`，或 int8=True data=<data.yaml>），
+# 输入输出绑定为 FP16 时缓冲区按绑定类型分配，H2D/D2H 数据量减半
 class YOLOv8TRT:
-    def __init__(self, engine_path, conf_thres=0.5, iou_thres=0.5):
+    def __init__(self, engine_path, conf_thres=0.5, iou_thres=0.5, num_slots=2):
         self.conf_thres = conf_thres
         self.iou_thres = iou_thres
         
@@ -27,16 +122,64 @@ class YOLOv8TRT:
         self.logger = trt.Logger(trt.Logger.WARNING)
         with open(engine_path, "rb") as f, trt.Runtime(self.logger) as runtime:
             self.engine = runtime.deserialize_cuda_engine(f.read())
-        self.context = self.engine.create_execution_context()
         
-        # 获取输入输出绑定信息
+        # 获取输入绑定信息
         self.input_binding = self.engine[0]
-        self.output_binding = self.engine[1]
         self.input_shape = self.engine.get_binding_shape(0)
         print(f"Input shape: {self.input_shape}")
+        self.input_h, self.input_w = int(self.input_shape[2]), int(self.input_shape[3])
+        
+        # 动态batch引擎（导出时 dynamic=True）：按优化配置的最大batch分配缓冲区，
+        # 每次推理前设置实际batch大小；静态引擎固定为1
+        self.dynamic_batch = self.input_shape[0] == -1
+        if self.dynamic_batch:
+            _, opt_shape, max_shape = self.engine.get_profile_shape(0, 0)
+            self.batch_opt, self.max_batch = int(opt_shape[0]), int(max_shape[0])
+        else:
+            self.batch_opt = self.max_batch = 1
+        
+        # 输入绑定的数据类型（FP16引擎可能为float16），预处理按float32计算后写入
+        self.input_dtype = trt.nptype(self.engine.get_binding_dtype(0))
+        
+        # 预处理持久缓冲区：letterbox画布(HWC uint8)，归一化结果直接写入各槽位的锁页输入缓冲区
+        self._canvas = np.full((self.input_h, self.input_w, 3), 114, dtype=np.uint8)
+        self._letterbox_key = None
+        self._letterbox = None
+        
+        # numba 解码内核的输出缓冲区（首次后处理时按锚点数分配）
+        self._decode_boxes = None
+        self._decode_scores = None
+        self._decode_cls = None
+        
+        # TensorRT 8.5+ 使用 execute_async_v3：按名称绑定张量地址，输出通过分配器写入
+        self.use_v3 = OutputAllocator is not None
+        
+        # 流水线槽位：每个槽位有独立的执行上下文、CUDA流、完成事件和输入输出缓冲区，
+        # 一帧在GPU上推理时可以同时预处理下一帧、后处理上一帧
+        self.num_slots = num_slots
+        self.slots = [self.create_slot() for _ in range(num_slots)]
+        self._next_slot = 0
+        
+        # 引擎是否已内置NMS
+        outputs = self.slots[0]['outputs']
+        self.nms_outputs = self.detect_nms_outputs(outputs)
+        print(f"Engine outputs: {[o['name'] for o in outputs]}, built-in NMS: {self.nms_outputs is not None}")
         
-        # 分配输入输出缓冲区
-        self.inputs, self.outputs, self.bindings, self.stream = self.allocate_buffers()
+        # 原始输出引擎：torch可用时输出直接写入torch显存张量，在GPU上做后处理
+        self.use_torch_nms = self.nms_outputs is None and torch is not None and torch.cuda.is_available()
+        if self.use_torch_nms:
+            for slot in self.slots:
+                output = slot['outputs'][0]
+                slot['raw_out'] = torch.empty(output['shape'], dtype=torch.from_numpy(output['host'][:0]).dtype,
+                                              device='cuda')
+                output['device'].free()
+                output['device'] = None
+                slot['bindings'][output['index']] = slot['raw_out'].data_ptr()
+        
+        # 张量地址在槽位生命周期内不变，只需绑定一次
+        if self.use_v3:
+            for slot in self.slots:
+                self.bind_tensors(slot)
         
     def allocate_buffers(self):
         inputs = []
@@ -44,76 +187,149 @@ class YOLOv8TRT:
         bindings = []
         stream = cuda.Stream()
         
-        # 输入缓冲区
-        input_size = trt.volume(self.engine.get_binding_shape(0)) * self.engine.max_batch_size
-        input_dtype = trt.nptype(self.engine.get_binding_dtype(0))
-        input_host = cuda.pagelocked_empty(input_size, input_dtype)
-        input_device = cuda.mem_alloc(input_host.nbytes)
-        bindings.append(int(input_device))
-        inputs.append({'host': input_host, 'device': input_device})
-        
-        # 输出缓冲区
-        output_size = trt.volume(self.engine.get_binding_shape(1)) * self.engine.max_batch_size
-        output_dtype = trt.nptype(self.engine.get_binding_dtype(1))
-        output_host = cuda.pagelocked_empty(output_size, output_dtype)
-        output_device = cuda.mem_alloc(output_host.nbytes)
-        bindings.append(int(output_device))
-        outputs.append({'host': output_host, 'device': output_device})
+        # 按绑定顺序为每个输入输出分配锁页主机内存和设备内存；
+        # H2D/D2H 两端都只使用这些锁页缓冲区（可分页内存会让异步拷贝退化为同步拷贝）
+        for i in range(self.engine.num_bindings):
+            shape = tuple(self.engine.get_binding_shape(i))
+            if shape[0] == -1:
+                shape = (self.max_batch,) + shape[1:]
+            size = trt.volume(shape) * self.engine.max_batch_size
+            dtype = trt.nptype(self.engine.get_binding_dtype(i))
+            host = cuda.pagelocked_empty(size, dtype)
+            device = cuda.mem_alloc(host.nbytes)
+            bindings.append(int(device))
+            
+            buffer = {'index': i, 'name': self.engine.get_binding_name(i), 'shape': shape,
+                      'per_image': trt.volume(shape[1:]), 'host': host, 'device': device}
+            if self.engine.binding_is_input(i):
+                inputs.append(buffer)
+            else:
+                outputs.append(buffer)
         
         return inputs, outputs, bindings, stream
     
-    def preprocess_image(self, image):
-        """预处理图像，转换为模型输入格式"""
-        # 调整大小并填充保持宽高比
+    def create_slot(self):
+        """创建一个流水线槽位"""
+        inputs, outputs, bindings, stream = self.allocate_buffers()
+        input_size = self.max_batch * 3 * self.input_h * self.input_w
+        return {
+            # 锁页输入缓冲区的NCHW视图，预处理结果直接写入这里
+            'input_view': inputs[0]['host'][:input_size].reshape(
+                self.max_batch, 3, self.input_h, self.input_w),
+            'context': self.engine.create_execution_context(),
+            'inputs': inputs,
+            'outputs': outputs,
+            'bindings': bindings,
+            'stream': stream,
+            'event': cuda.Event(),
+            'raw_out': None,
+            'allocators': []
+        }
+    
+    def bind_tensors(self, slot):
+        """execute_async_v3：按名称绑定输入地址，为每个输出注册指向已分配显存的分配器"""
+        context = slot['context']
+        for buffer in slot['inputs']:
+            context.set_tensor_address(buffer['name'], slot['bindings'][buffer['index']])
+        for buffer in slot['outputs']:
+            allocator = OutputAllocator(buffer, slot['bindings'][buffer['index']])
+            context.set_output_allocator(buffer['name'], allocator)
+            slot['allocators'].append(allocator)
+    
+    def detect_nms_outputs(self, outputs):
+        """识别引擎内置的NMS输出，返回名称到输出序号的映射，原始输出引擎返回None"""
+        if len(outputs) == 4:
+            # EfficientNMS_TRT：优先按名称匹配，否则按插件固定的输出顺序
+            keys = ('num', 'box', 'score', 'class')
+            named = {key: next((i for i, o in enumerate(outputs) if key in o['name'].lower()), None)
+                     for key in keys}
+            if any(i is None for i in named.values()):
+                named = {key: i for i, key in enumerate(keys)}
+            return named
+        if len(outputs) == 1 and outputs[0]['shape'][-1] == 6:
+            # ultralytics nms=True：每行为 x1, y1, x2, y2, score, class
+            return {'end2end': 0}
+        return None
+    
+    def preprocess_image(self, image, out=None):
+        """
+        预处理图像，转换为模型输入格式（不产生中间数组）
+        :param out: 接收CHW结果的数组，通常为锁页输入缓冲区的视图；未指定时分配锁页内存
+        """
+        # 调整大小并填充保持宽高比，输入尺寸不变时复用上一帧的缩放参数
         h, w, _ = image.shape
-        scale = min(self.input_shape[2] / h, self.input_shape[3] / w)  # CHW格式
-        new_h, new_w = int(h * scale), int(w * scale)
-        resized = cv2.resize(image, (new_w, new_h))
+        if self._letterbox_key != (h, w):
+            scale = min(self.input_h / h, self.input_w / w)
+            new_h, new_w = int(h * scale), int(w * scale)
+            top = (self.input_h - new_h) // 2
+            left = (self.input_w - new_w) // 2
+            # 缩小用 INTER_AREA（更快且无混叠），放大用 INTER_LINEAR
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            self._canvas.fill(114)
+            self._letterbox = (scale, new_w, new_h, top, left, interpolation)
+            self._letterbox_key = (h, w)
+        scale, new_w, new_h, top, left, interpolation = self._letterbox
         
-        # 创建画布并填充
-        canvas = np.full((self.input_shape[2], self.input_shape[3], 3), 114, dtype=np.uint8)
-        top = (self.input_shape[2] - new_h) // 2
-        left = (self.input_shape[3] - new_w) // 2
-        canvas[top:top+new_h, left:left+new_w] = resized
+        # 直接缩放到画布中间区域，边框的填充值保持不变
+        cv2.resize(image, (new_w, new_h), dst=self._canvas[top:top+new_h, left:left+new_w],
+                   interpolation=interpolation)
         
-        # 转换格式并归一化
-        canvas = canvas.astype(np.float32) / 255.0
-        canvas = np.transpose(canvas, (2, 0, 1))  # HWC to CHW
-        return np.ascontiguousarray(canvas), scale, (left, top)
+        # 归一化与HWC→CHW转置一次完成，直接写入输入缓冲区（FP16输入时在写入时降精度）
+        if out is None:
+            out = cuda.pagelocked_empty((3, self.input_h, self.input_w), self.input_dtype)
+        np.divide(self._canvas.transpose(2, 0, 1), np.float32(255.0), out=out, dtype=np.float32)
+        return out, scale, (left, top)
     
     def postprocess(self, outputs, scale, padding, img_shape):
         """后处理检测结果 - 修复版"""
         # 输出形状通常是 [1, 84, 8400] 对于YOLOv8
-        output = outputs[0].reshape(1, 4 + len(CLASS_NAMES), -1)  # [1, 13, 8400]
-        output = output[0].transpose()  # 转置为 [8400, 13]
-        
-        # 分离边界框坐标和类别分数
-        boxes = output[:, :4]
-        scores = output[:, 4:4+len(CLASS_NAMES)]
-        
-        # 获取最大类别分数和ID
-        class_ids = np.argmax(scores, axis=1)
-        max_scores = np.max(scores, axis=1)
+        output = outputs[0].reshape(4 + len(CLASS_NAMES), -1)  # [13, 8400]
         
-        # 应用置信度阈值
-        mask = max_scores > self.conf_thres
-        boxes = boxes[mask]
-        max_scores = max_scores[mask]
-        class_ids = class_ids[mask]
-        
-        if len(boxes) == 0:
-            return []
-        
-        # 将中心点宽高转换为左上右下坐标
-        boxes = self.xywh2xyxy(boxes)
-        
-        # 调整框坐标到原始图像
-        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - padding[0]) / scale
-        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - padding[1]) / scale
-        
-        # 裁剪坐标到图像范围内
-        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, img_shape[1])
-        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, img_shape[0])
+        if njit is not None and output.dtype == np.float32:
+            # numba 内核一次遍历完成解码，结果写入复用的缓冲区
+            num_anchors = output.shape[1]
+            if self._decode_boxes is None or len(self._decode_boxes) < num_anchors:
+                self._decode_boxes = np.empty((num_anchors, 4), dtype=np.float32)
+                self._decode_scores = np.empty(num_anchors, dtype=np.float32)
+                self._decode_cls = np.empty(num_anchors, dtype=np.int32)
+            count = decode_outputs(output, self.conf_thres, scale, padding[0], padding[1],
+                                   img_shape[1], img_shape[0],
+                                   self._decode_boxes, self._decode_scores, self._decode_cls)
+            if count == 0:
+                return []
+            boxes = self._decode_boxes[:count]
+            max_scores = self._decode_scores[:count]
+            class_ids = self._decode_cls[:count]
+        else:
+            output = output.transpose()  # 转置为 [8400, 13]
+            
+            # 分离边界框坐标和类别分数
+            boxes = output[:, :4]
+            scores = output[:, 4:4+len(CLASS_NAMES)]
+            
+            # 获取最大类别分数和ID
+            class_ids = np.argmax(scores, axis=1)
+            max_scores = np.max(scores, axis=1)
+            
+            # 应用置信度阈值，FP16输出在过滤后再转为float32
+            mask = max_scores > self.conf_thres
+            boxes = boxes[mask].astype(np.float32, copy=False)
+            max_scores = max_scores[mask].astype(np.float32, copy=False)
+            class_ids = class_ids[mask]
+            
+            if len(boxes) == 0:
+                return []
+            
+            # 将中心点宽高转换为左上右下坐标（掩码索引已产生副本，可原地修改）
+            boxes = self.xywh2xyxy_inplace(boxes)
+            
+            # 调整框坐标到原始图像
+            boxes[:, [0, 2]] = (boxes[:, [0, 2]] - padding[0]) / scale
+            boxes[:, [1, 3]] = (boxes[:, [1, 3]] - padding[1]) / scale
+            
+            # 裁剪坐标到图像范围内
+            boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, img_shape[1])
+            boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, img_shape[0])
         
         # 应用NMS
         indices = self.nms(boxes, max_scores, self.iou_thres)
@@ -133,14 +349,77 @@ class YOLOv8TRT:
         
         return results
     
-    def xywh2xyxy(self, x):
-        """将中心点宽高转换为左上右下坐标"""
-        y = np.zeros_like(x)
-        y[:, 0] = x[:, 0] - x[:, 2] / 2  # 左上x
-        y[:, 1] = x[:, 1] - x[:, 3] / 2  # 左上y
-        y[:, 2] = x[:, 0] + x[:, 2] / 2  # 右下x
-        y[:, 3] = x[:, 1] + x[:, 3] / 2  # 右下y
-        return y
+    def postprocess_gpu(self, raw_out, scale, padding, img_shape):
+        """在GPU上完成阈值过滤、坐标变换和按类别NMS，只把保留的检测框拷回主机"""
+        output = raw_out.view(4 + len(CLASS_NAMES), -1).t()  # [8400, 13]
+        
+        # FP16输出在阈值过滤后再转为float32
+        scores, class_ids = output[:, 4:].max(dim=1)
+        mask = scores > self.conf_thres
+        xywh = output[mask, :4].float()
+        if xywh.shape[0] == 0:
+            return []
+        scores, class_ids = scores[mask].float(), class_ids[mask]
+        
+        # 中心点宽高转换为左上右下坐标，并调整到原始图像
+        half_wh = xywh[:, 2:] / 2
+        boxes = torch.cat((xywh[:, :2] - half_wh, xywh[:, :2] + half_wh), dim=1)
+        boxes[:, 0::2] = ((boxes[:, 0::2] - padding[0]) / scale).clamp_(0, img_shape[1])
+        boxes[:, 1::2] = ((boxes[:, 1::2] - padding[1]) / scale).clamp_(0, img_shape[0])
+        
+        keep = torchvision.ops.batched_nms(boxes, scores, class_ids, self.iou_thres)
+        boxes = boxes[keep].cpu().numpy()
+        scores = scores[keep].cpu().numpy()
+        class_ids = class_ids[keep].cpu().numpy()
+        
+        results = []
+        for (x1, y1, x2, y2), class_id, score in zip(boxes, class_ids, scores):
+            results.append({
+                'box': [x1, y1, x2, y2],
+                'class_id': int(class_id),
+                'confidence': float(score),
+                'class_name': CLASS_NAMES[int(class_id)]
+            })
+        
+        return results
+    
+    def postprocess_nms(self, outputs, scale, padding, img_shape):
+        """后处理内置NMS引擎的输出，只处理保留下来的检测框"""
+        host = {key: outputs[i] for key, i in self.nms_outputs.items()}
+        if 'end2end' in host:
+            dets = host['end2end'].reshape(-1, 6)
+            dets = dets[dets[:, 4] > self.conf_thres]
+            boxes, scores, class_ids = dets[:, :4].astype(np.float32), dets[:, 4], dets[:, 5]
+        else:
+            num = int(host['num'][0])
+            boxes = host['box'].reshape(-1, 4)[:num].astype(np.float32)
+            scores = host['score'][:num]
+            class_ids = host['class'][:num]
+        
+        if len(boxes) == 0:
+            return []
+        
+        # 调整框坐标到原始图像并裁剪
+        boxes[:, [0, 2]] = np.clip((boxes[:, [0, 2]] - padding[0]) / scale, 0, img_shape[1])
+        boxes[:, [1, 3]] = np.clip((boxes[:, [1, 3]] - padding[1]) / scale, 0, img_shape[0])
+        
+        results = []
+        for (x1, y1, x2, y2), class_id, score in zip(boxes, class_ids, scores):
+            results.append({
+                'box': [x1, y1, x2, y2],
+                'class_id': int(class_id),
+                'confidence': float(score),
+                'class_name': CLASS_NAMES[int(class_id)]
+            })
+        
+        return results
+    
+    def xywh2xyxy_inplace(self, x):
+        """将中心点宽高原地转换为左上右下坐标（x 须为可写的独立数组）"""
+        half_wh = x[:, 2:] * 0.5
+        x[:, 2:] = x[:, :2] + half_wh  # 右下x, 右下y
+        x[:, :2] -= half_wh            # 左上x, 左上y
+        return x
     
     def nms(self, boxes, scores, iou_threshold):
         """非极大值抑制 - 使用OpenCV实现"""
@@ -153,28 +432,83 @@ class YOLOv8TRT:
         
         return indices.flatten() if len(indices) > 0 else []
     
-    def detect(self, image):
-        """执行目标检测"""
-        # 预处理
-        preprocessed, scale, padding = self.preprocess_image(image)
-        img_h, img_w = image.shape[:2]
+    def submit_batch(self, images):
+        """
+        预处理并异步提交一批图像推理（同时在途的批次数不能超过槽位数）
+        :param images: 图像列表，长度不超过 max_batch
+        :return: 传给 collect_batch 的句柄
+        """
+        slot = self.slots[self._next_slot]
+        self._next_slot = (self._next_slot + 1) % self.num_slots
+        stream = slot['stream']
+        n = len(images)
         
-        # 将输入数据复制到GPU
-        np.copyto(self.inputs[0]['host'], preprocessed.ravel())
-        cuda.memcpy_htod_async(self.inputs[0]['device'], self.inputs[0]['host'], self.stream)
+        # 预处理，结果直接写入锁页输入缓冲区
+        metas = []
+        for k, image in enumerate(images):
+            _, scale, padding = self.preprocess_image(image, out=slot['input_view'][k])
+            metas.append((scale, padding, image.shape[:2]))
+        
+        # 动态batch引擎设置本次的实际batch大小
+        context = slot['context']
+        input_buf = slot['inputs'][0]
+        if self.dynamic_batch:
+            input_shape = (n, 3, self.input_h, self.input_w)
+            if self.use_v3:
+                context.set_input_shape(input_buf['name'], input_shape)
+            else:
+                context.set_binding_shape(0, input_shape)
+        
+        # 将输入数据复制到GPU（只复制本批次的图像）
+        cuda.memcpy_htod_async(input_buf['device'], input_buf['host'][:n * input_buf['per_image']], stream)
         
         # 执行推理
-        self.context.execute_async_v2(bindings=self.bindings, stream_handle=self.stream.handle)
+        if self.use_v3:
+            context.execute_async_v3(stream.handle)
+        else:
+            context.execute_async_v2(bindings=slot['bindings'], stream_handle=stream.handle)
         
-        # 将输出从GPU复制回主机
-        cuda.memcpy_dtoh_async(self.outputs[0]['host'], self.outputs[0]['device'], self.stream)
-        self.stream.synchronize()
+        # 将输出从GPU复制回主机（内置NMS时只有少量检测结果；torch后处理时输出留在GPU上）
+        if not self.use_torch_nms:
+            for output in slot['outputs']:
+                cuda.memcpy_dtoh_async(output['host'][:n * output['per_image']], output['device'], stream)
         
-        # 后处理
-        output_data = [output['host'] for output in self.outputs]
-        results = self.postprocess(output_data, scale, padding, (img_h, img_w))
+        # 记录完成事件，collect_batch 时只等待这一批
+        slot['event'].record(stream)
+        return slot, metas
+    
+    def collect_batch(self, handle):
+        """等待一批推理完成并返回每张图像的后处理结果"""
+        slot, metas = handle
+        slot['event'].synchronize()
         
-        return results
+        # 后处理
+        batch_results = []
+        for k, (scale, padding, img_shape) in enumerate(metas):
+            if self.use_torch_nms:
+                results = self.postprocess_gpu(slot['raw_out'][k], scale, padding, img_shape)
+            else:
+                # 直接使用锁页输出缓冲区的视图，不拷贝到可分页内存
+                output_data = [output['host'][k * output['per_image']:(k + 1) * output['per_image']]
+                               for output in slot['outputs']]
+                if self.nms_outputs is not None:
+                    results = self.postprocess_nms(output_data, scale, padding, img_shape)
+                else:
+                    results = self.postprocess(output_data, scale, padding, img_shape)
+            batch_results.append(results)
+        return batch_results
+    
+    def submit(self, image):
+        """预处理并异步提交单张图像推理"""
+        return self.submit_batch([image])
+    
+    def collect(self, handle):
+        """等待单张图像推理完成并返回后处理结果"""
+        return self.collect_batch(handle)[0]
+    
+    def detect(self, image):
+        """执行目标检测"""
+        return self.collect(self.submit(image))
 
 class TransForm:
     def __init__(self, camera_coordinates=None, robot_coordinates=None):
@@ -206,6 +540,11 @@ class TransForm:
         self.H, _ = cv2.findHomography(self.camera_points, self.robot_points)
         print(f"Homography matrix:\n{self.H}")
         
+        # 单应性矩阵的9个元素缓存为Python浮点数，单点转换直接做标量运算
+        (self.H00, self.H01, self.H02,
+         self.H10, self.H11, self.H12,
+         self.H20, self.H21, self.H22) = self.H.ravel().tolist()
+        
         # 计算图像中心在机械臂坐标系中的位置
         self.center_point = self.convertCoordinate(320, 240)
         print(f"Image center in robot coordinates: {self.center_point}")
@@ -217,12 +556,22 @@ class TransForm:
         :param y: 图像y坐标
         :return: (机械臂x坐标, 机械臂y坐标)
         """
-        # 使用单应性矩阵转换坐标
-        point = np.array([[x, y]], dtype=np.float32)
-        transformed = cv2.perspectiveTransform(point.reshape(1, -1, 2), self.H)
-        
-        # 返回转换后的坐标
-        return transformed[0][0][0], transformed[0][0][1]
+        # 使用单应性矩阵转换坐标（等价于cv2.perspectiveTransform的单点计算）
+        w = self.H20 * x + self.H21 * y + self.H22
+        return ((self.H00 * x + self.H01 * y + self.H02) / w,
+                (self.H10 * x + self.H11 * y + self.H12) / w)
+    
+    def convertCoordinates(self, pts_xy):
+        """
+        批量将图像坐标转换为机械臂坐标
+        :param pts_xy: (N, 2) 图像坐标数组
+        :return: (N, 2) 机械臂坐标数组
+        """
+        pts_xy = np.asarray(pts_xy, dtype=np.float64).reshape(-1, 2)
+        x, y = pts_xy[:, 0], pts_xy[:, 1]
+        w = self.H20 * x + self.H21 * y + self.H22
+        return np.stack(((self.H00 * x + self.H01 * y + self.H02) / w,
+                         (self.H10 * x + self.H11 * y + self.H12) / w), axis=1)
     
     def getCoordinate(self, img, x, y):
         """
@@ -236,6 +585,16 @@ class TransForm:
 
 # 机械臂控制类
 class ArmServo:
+    # 各类垃圾的放置位置
+    _POSITIONS = (
+        (20.6, 127.1),    # 厨余垃圾
+        (99.5, 121.7),    # 可回收垃圾
+        (189.6, 142.4),   # 有害垃圾
+        (189.6, 142.4)    # 其他垃圾
+    )
+    # 类别ID → 放置位置序号：0-2 食物类，3-5 可回收类，6-7 有害垃圾，其余为其他垃圾
+    _POS_LUT = (0, 0, 0, 1, 1, 1, 2, 2, 3)
+    
     def __init__(self, port=None, baudrate=115200, yaml_path='./resource/arm_polar.yaml'):
         self.port = self.checkport(port)
         self.baudrate = baudrate
@@ -351,24 +710,60 @@ class ArmServo:
         
         # 发送初始化指令
         self.send_command("G0 X150 Y0 Z90 F1000")
-        time.sleep(2)
+        self.wait_for_moves()
         self.send_command("M2231 V0")  # 设置手腕角度
         print("Arm initialized to home position")
     
-    def send_command(self, command):
-        """发送指令给机械臂"""
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def encode_command(command):
+        """编码指令（pick_object 会反复发送相同的G-code）"""
+        return f"{command}\r\n".encode()
+    
+    def send_command(self, command, wait_ok=True, timeout=3.0):
+        """发送指令给机械臂，默认等待固件返回 ok"""
         if not self.arm:
             print("Cannot send command: arm not connected")
             return False
         
         try:
-            self.arm.write(f"{command}\r\n".encode())
-            time.sleep(0.1)
-            return True
+            self.arm.write(self.encode_command(command))
+            if not wait_ok:
+                return True
+            return self.read_until_ok(timeout) is not None
         except serial.SerialException as e:
             print(f"Error sending command: {e}")
             return False
     
+    def read_until_ok(self, timeout):
+        """读取响应直到出现 ok（跳过主动上报的行），返回该行，超时返回None"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            line = self.arm.readline()
+            if b'ok' in line:
+                return line
+        print("Timed out waiting for arm response")
+        return None
+    
+    def wait_for_moves(self, timeout=10.0):
+        """轮询 M2200（是否在运动）直到机械臂停止，代替固定的等待时间"""
+        if not self.arm:
+            return False
+        
+        deadline = time.time() + timeout
+        try:
+            while time.time() < deadline:
+                self.arm.write(self.encode_command("M2200"))
+                line = self.read_until_ok(max(deadline - time.time(), 0.1))
+                if line is None:
+                    return False
+                if b'V0' in line:
+                    return True
+                time.sleep(0.05)
+        except serial.SerialException as e:
+            print(f"Error waiting for arm: {e}")
+        return False
+    
     def move_to_position(self, x, y, z, speed=1000):
         """移动机械臂到指定位置"""
         command = f"G0 X{x} Y{y} Z{z} F{speed}"
@@ -388,24 +783,24 @@ class ArmServo:
         
         # 移动到物体上方
         self.move_to_position(x, y, 50)
-        time.sleep(2)
+        self.wait_for_moves()
         
         # 下降到物体位置
         self.move_to_position(x, y, self.polar_height)
-        time.sleep(2)
+        self.wait_for_moves()
         
-        # 抓取物体
+        # 抓取物体（夹爪动作没有运动状态反馈，保留固定等待）
         self.set_gripper(1)
         time.sleep(2)
         
         # 抬起物体
         self.move_to_position(x, y, 50)
-        time.sleep(2)
+        self.wait_for_moves()
         
         # 移动到分类区域 (根据类别决定位置)
         target_x, target_y = self.get_classification_position(class_id)
         self.move_to_position(target_x, target_y, 50)
-        time.sleep(2)
+        self.wait_for_moves()
         
         # 下降到放置高度
         #self.move_to_position(target_x, target_y, self.polar_height)
@@ -417,7 +812,7 @@ class ArmServo:
         
         # 抬起机械臂
         self.move_to_position(target_x, target_y, 50)
-        time.sleep(2)
+        self.wait_for_moves()
         
         # 返回初始位置
         self.initialize_arm()
@@ -426,23 +821,10 @@ class ArmServo:
     
     def get_classification_position(self, class_id):
         """根据垃圾类别返回放置位置"""
-        # 简化版：根据类别ID映射到不同区域
-        positions = [
-            (20.6, 127.1),    # 厨余垃圾
-            (99.5, 121.7),   # 可回收垃圾
-            (189.6, 142.4),   # 有害垃圾
-            (189.6, 142.4)   # 其他垃圾
-        ]
-        
-        # 根据类别ID确定垃圾类型
-        if class_id in [0, 1, 2]:  # 食物类
-            return positions[0]
-        elif class_id in [3, 4, 5]:  # 可回收类
-            return positions[1]
-        elif class_id in [6, 7]:  # 有害垃圾
-            return positions[2]
-        else:  # 其他垃圾
-            return positions[3]
+        # 简化版：按类别ID查表映射到不同区域，超出范围的归为其他垃圾
+        if 0 <= class_id < len(self._POS_LUT):
+            return self._POSITIONS[self._POS_LUT[class_id]]
+        return self._POSITIONS[3]
 
 # 主应用类
 class GarbageSortingSystem:
@@ -460,86 +842,191 @@ class GarbageSortingSystem:
         # 状态变量
         self.stable_count = 0
         self.STABLE_THRESHOLD = 15  # 连续检测到物体30帧视为稳定
+        self.BATCH_WAIT = 0.01  # 动态batch引擎凑批的最长等待时间(秒)
+        
+        # 可视化用的每类固定颜色和标签前缀，只计算一次
+        self._class_colors = [tuple(int(c) for c in np.random.RandomState(i).randint(64, 255, 3))
+                              for i in range(len(CLASS_NAMES))]
+        self._class_labels = [f"{name}: " for name in CLASS_NAMES]
+        
+        # 可视化线程：只保留最新一帧，绘制不占用检测循环；
+        # HighGUI（imshow/waitKey）在Cocoa和部分Qt构建上只能在主线程调用，显示仍由主线程完成
+        self.WINDOW_NAME = "Garbage Sorting System"
+        self.viz_q = queue.Queue(maxsize=1)
+        self.rendered_q = queue.Queue(maxsize=1)
+        self._viz_stop = threading.Event()
+        
+        # 采集线程：cap.read() 每次阻塞约一个帧间隔，放在独立线程中读取，
+        # 检测循环落后于摄像头时从积压的帧中凑批
+        self._capture_stop = threading.Event()
+        
+        # 裁剪区域缓存（摄像头分辨率不变时只计算一次）
+        self.FRAME_SIZE = (640, 480)
+        self._crop_key = None
+        self._crop_slice = None
         
-    def visualize_results(self, image, results):
+    def visualize_results(self, image, results, stable_count=None):
         """在图像上可视化检测结果"""
+        if stable_count is None:
+            stable_count = self.stable_count
         display_img = image.copy()
         
         for result in results:
             x1, y1, x2, y2 = result['box']
             class_id = result['class_id']
-            class_name = result['class_name']
             confidence = result['confidence']
             
-            # 绘制边界框
-            color = (0, 255, 0)  # 绿色
+            # 绘制边界框（每类固定颜色）
+            color = self._class_colors[class_id]
             cv2.rectangle(display_img, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
             
-            # 绘制类别标签
-            label = f"{class_name}: {confidence:.2f}"
+            # 绘制类别标签，类别名部分已预先生成
+            label = self._class_labels[class_id] + f"{confidence:.2f}"
             cv2.putText(display_img, label, (int(x1), int(y1) - 10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
             
-            # 计算中心点
-            center_x = int((x1 + x2) / 2)
-            center_y = int((y1 + y2) / 2)
+            # 中心点与机械臂坐标已在 handle_results 中批量算好
+            center_x, center_y = int(result['center'][0]), int(result['center'][1])
             cv2.circle(display_img, (center_x, center_y), 5, (0, 0, 255), -1)
             
-            # 计算机械臂坐标系坐标
-            arm_x, arm_y = self.transformer.getCoordinate(image, center_x, center_y)
+            arm_x, arm_y = result['arm_xy']
             coord_text = f"({arm_x:.1f}, {arm_y:.1f})"
             cv2.putText(display_img, coord_text, (center_x + 10, center_y),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
         
         # 显示稳定计数
-        cv2.putText(display_img, f"Stable: {self.stable_count}/{self.STABLE_THRESHOLD}", 
+        cv2.putText(display_img, f"Stable: {stable_count}/{self.STABLE_THRESHOLD}", 
                     (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
         
         return display_img
     
+    def prepare_frame(self, frame):
+        """裁剪并缩放摄像头图像"""
+        # 裁剪图像区域 (根据实际摄像头安装位置调整)
+        shape = frame.shape[:2]
+        if shape != self._crop_key:
+            h, w = shape
+            self._crop_slice = (slice(int(h/4.6), int(h - h/2.7)),
+                                slice(int(w/3.4), int(w - w/4.5)))
+            self._crop_key = shape
+        cropped = frame[self._crop_slice]
+        
+        # 裁剪后已是目标尺寸则跳过缩放；cap.read() 每帧返回新数组，切片视图可安全放入流水线
+        if cropped.shape[1::-1] == self.FRAME_SIZE:
+            return cropped
+        return cv2.resize(cropped, self.FRAME_SIZE)
+    
     def process_frame(self, frame):
         """处理单帧图像"""
-        # 裁剪图像区域 (根据实际摄像头安装位置调整)
-        h, w = frame.shape[:2]
-        cropped = frame[int(h/4.6):int(h - h/2.7), int(w/3.4):int(w - w/4.5)]
-        resized = cv2.resize(cropped, (640, 480))
+        resized = self.prepare_frame(frame)
         
         # 执行目标检测
         results = self.detector.detect(resized)
+        self.handle_results(resized, results)
+        return self.visualize_results(resized, results)
+    
+    @staticmethod
+    def _put_dropping_oldest(q, item):
+        """放入有界队列，队列已满时丢弃最旧的一项（每个队列只有一个生产者）"""
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            q.put_nowait(item)
+    
+    def show_results(self, resized, results):
+        """把一帧交给可视化线程，队列中未显示的旧帧直接丢弃"""
+        self._put_dropping_oldest(self.viz_q, (resized, results, self.stable_count))
+    
+    def _capture_loop(self, cap, frame_q):
+        """采集线程：持续读取并裁剪缩放摄像头帧，读取失败时放入None通知主循环"""
+        while not self._capture_stop.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                self._put_dropping_oldest(frame_q, None)
+                return
+            self._put_dropping_oldest(frame_q, self.prepare_frame(frame))
+    
+    def next_batch(self, frame_q):
+        """
+        从采集队列取一批帧：等待第一帧，之后最多再等 BATCH_WAIT 秒凑满 batch_opt 帧
+        :return: 帧列表（0.1秒内没有新帧时为空，以便主线程继续处理窗口事件）；摄像头读取失败时返回None
+        """
+        try:
+            frame = frame_q.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        if frame is None:
+            return None
+        frames = [frame]
+        deadline = time.time() + self.BATCH_WAIT
+        while len(frames) < self.detector.batch_opt:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                frame = frame_q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if frame is None:
+                # 先处理已取到的帧，下次调用再返回None
+                self._put_dropping_oldest(frame_q, None)
+                break
+            frames.append(frame)
+        return frames
+    
+    def _viz_loop(self):
+        """可视化线程：绘制最新一帧，结果交给主线程显示"""
+        while not self._viz_stop.is_set():
+            try:
+                resized, results, stable_count = self.viz_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self._put_dropping_oldest(self.rendered_q, self.visualize_results(resized, results, stable_count))
+    
+    def pump_display(self):
+        """
+        在主线程显示最新绘制好的帧并处理窗口事件
+        :return: 是否按下了退出键 q
+        """
+        try:
+            cv2.imshow(self.WINDOW_NAME, self.rendered_q.get_nowait())
+        except queue.Empty:
+            pass
+        return cv2.waitKey(1) & 0xFF == ord('q')
+    
+    def handle_results(self, resized, results):
+        """打印检测结果并根据稳定状态控制机械臂"""
 
-            # 新增：打印每个检测到的物体的坐标
         if results:
-            print("\n===== 检测到的物体坐标 =====")
-            for i, result in enumerate(results, 1):
-                # 1. 计算摄像头像素坐标（基于处理后的 640x480 图像）
-                x1, y1, x2, y2 = result['box']  # 物体边界框（左上、右下坐标）
-                center_x = (x1 + x2) / 2  # 中心点 x 坐标（摄像头像素）
-                center_y = (y1 + y2) / 2  # 中心点 y 坐标（摄像头像素）
+            # 1. 一次性计算所有物体的中心点（基于处理后的 640x480 图像）并转换为机械臂坐标
+            boxes = np.array([result['box'] for result in results], dtype=np.float32)
+            centers = (boxes[:, :2] + boxes[:, 2:]) * 0.5
+            arm_coords = self.transformer.convertCoordinates(centers)
             
-                # 2. 转换为机械臂坐标
-                arm_x, arm_y = self.transformer.getCoordinate(resized, center_x, center_y)
+            # 2. 挂回检测结果，供可视化和稳定性判断复用
+            for result, center, arm_xy in zip(results, centers, arm_coords):
+                result['center'] = center
+                result['arm_xy'] = arm_xy
             
+            # 新增：打印每个检测到的物体的坐标
+            print("\n===== 检测到的物体坐标 =====")
+            for i, (result, (center_x, center_y), (arm_x, arm_y)) in enumerate(
+                    zip(results, centers, arm_coords), 1):
                 # 3. 打印结果（包含物体类别、摄像头坐标、机械臂坐标）
                 print(f"物体 {i}: {result['class_name']}")
                 print(f"  摄像头像素坐标: ({center_x:.2f}, {center_y:.2f}) 像素")
                 print(f"  机械臂坐标: ({arm_x:.2f}, {arm_y:.2f})")
             print("==========================\n")
         
-        # 可视化结果
-        display_img = self.visualize_results(resized, results)
-        
         # 检查稳定状态
         if results:
             # 只处理第一个检测到的物体
             main_obj = results[0]
-            
-            # 计算中心点
-            x1, y1, x2, y2 = main_obj['box']
-            center_x = int((x1 + x2) / 2)
-            center_y = int((y1 + y2) / 2)
-            
-            # 转换为机械臂坐标
-            arm_x, arm_y = self.transformer.getCoordinate(resized, center_x, center_y)
+            arm_x, arm_y = main_obj['arm_xy']
             
             # 检查位置是否稳定
             if self.stable_count > 0 and abs(arm_x - self.last_x) < 1.0 and abs(arm_y - self.last_y) < 1.0:
@@ -559,8 +1046,6 @@ class GarbageSortingSystem:
                 self.arm_controller.pick_object(arm_x, arm_y, main_obj['class_id'])
         else:
             self.stable_count = 0
-        
-        return display_img
     
     def run_from_camera(self, camera_index=0):
         """从摄像头捕获并处理视频流"""
@@ -571,23 +1056,48 @@ class GarbageSortingSystem:
         
         print("Starting garbage sorting system. Press 'q' to exit.")
         
+        # 已提交但尚未取回结果的帧
+        pending = deque()
+        
+        self._viz_stop.clear()
+        viz_thread = threading.Thread(target=self._viz_loop, daemon=True)
+        viz_thread.start()
+        
+        # 采集队列最多积压两批帧，超出时丢弃最旧的帧
+        frame_q = queue.Queue(maxsize=2 * self.detector.max_batch)
+        self._capture_stop.clear()
+        capture_thread = threading.Thread(target=self._capture_loop, args=(cap, frame_q), daemon=True)
+        capture_thread.start()
+        
         try:
             while True:
-                ret, frame = cap.read()
-                if not ret:
-                    print("Error: Failed to capture frame")
+                # 显示最新结果，检查退出键
+                if self.pump_display():
                     break
                 
-                # 处理帧
-                processed_frame = self.process_frame(frame)
+                # 凑批：动态batch引擎最多凑 batch_opt 帧，超过等待时间立即提交
+                frames = self.next_batch(frame_q)
+                if frames is None:
+                    print("Error: Failed to capture frame")
+                    break
+                if not frames:
+                    continue
                 
-                # 显示结果
-                cv2.imshow("Garbage Sorting System", processed_frame)
+                # 提交当前批次推理，GPU推理期间处理较早一批的结果
+                pending.append((frames, self.detector.submit_batch(frames)))
+                if len(pending) < self.detector.num_slots:
+                    continue
                 
-                # 检查退出键
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                # 处理帧，绘制交给可视化线程
+                frames, handle = pending.popleft()
+                for resized, results in zip(frames, self.detector.collect_batch(handle)):
+                    self.handle_results(resized, results)
+                    self.show_results(resized, results)
         finally:
+            self._capture_stop.set()
+            self._viz_stop.set()
+            capture_thread.join(timeout=1.0)
+            viz_thread.join(timeout=1.0)
             cap.release()
             cv2.destroyAllWindows()
             print("System stopped")
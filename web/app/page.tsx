@@ -385,8 +385,18 @@ export default function SmartBinDashboard() {
       })
 
       if (response.ok) {
-        const result = await response.json()
-        setDetectionResult(result)
+        if (detectionResult?.image?.startsWith('blob:')) {
+          URL.revokeObjectURL(detectionResult.image)
+        }
+        if (response.headers.get('Content-Type')?.includes('application/json')) {
+          // 检测结果过多时为JSON响应体，标注图像以base64 data URL放在 image 字段
+          setDetectionResult(await response.json())
+        } else {
+          // 响应体为标注后的JPEG，检测结果在 X-Detections 响应头中
+          const result = JSON.parse(response.headers.get('X-Detections') || '{}')
+          const imageBlob = await response.blob()
+          setDetectionResult({ ...result, image: URL.createObjectURL(imageBlob) })
+        }
         setError(null)
       } else {
         const errorData = await response.json()
@@ -556,7 +566,8 @@ export default function SmartBinDashboard() {
         formData.append('image', blob, 'capture.jpg')
 
         try {
-          const apiUrl = getApiUrl(API_ENDPOINTS.DETECT_IMAGE)
+          // 实时检测只需要检测结果，image=0 时服务端不绘制和编码图像，直接返回JSON
+          const apiUrl = `${getApiUrl(API_ENDPOINTS.DETECT_IMAGE)}?image=0`
           
           const response = await fetch(apiUrl, {
             method: 'POST',